@@ -14,6 +14,12 @@ if sys.version_info[0] > 2:
     if sys.version_info[1] == 2:
         collect_ignore.append('tests/handlers/logbook')
 
+if sys.version_info < (3, 5):
+    collect_ignore.append('tests/transport/asyncio')
+
+if sys.version_info < (3, 7):
+    collect_ignore.append('tests/context/asyncio')
+
 try:
     import gevent  # NOQA
 except ImportError:
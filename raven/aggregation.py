@@ -0,0 +1,162 @@
+"""
+raven.aggregation
+~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2010-2012 by the Sentry Team, see AUTHORS for more details.
+:license: BSD, see LICENSE for more details.
+"""
+from __future__ import absolute_import
+
+import threading
+import time
+
+from raven.conf import defaults
+from raven.utils.compat import iteritems
+
+__all__ = ('EventAggregator', 'Summary')
+
+# the share of fingerprints evicted at once when the table is full
+EVICT_FRACTION = 0.1
+
+
+class Summary(object):
+    """
+    The number of events with ``fingerprint`` which were suppressed in the
+    window from ``start`` to ``end``.
+    """
+
+    __slots__ = ('fingerprint', 'count', 'start', 'end')
+
+    def __init__(self, fingerprint, count, start, end):
+        self.fingerprint = fingerprint
+        self.count = count
+        self.start = start
+        self.end = end
+
+    def __repr__(self):
+        return '<%s: %r x%d>' % (
+            type(self).__name__, self.fingerprint, self.count)
+
+
+class EventAggregator(object):
+    """
+    Suppresses storms of duplicate events.
+
+    Events are grouped by a fingerprint computed before they are built. In
+    every ``window`` seconds the first ``limit`` events of a fingerprint
+    are sent and the rest are only counted. Once a window in which events
+    were suppressed is over, a ``Summary`` of them is handed out so that
+    it can be sent instead.
+
+    At most ``max_fingerprints`` fingerprints are tracked, the least
+    recently seen ones are forgotten first.
+    """
+
+    def __init__(self, window=defaults.AGGREGATE_WINDOW,
+                 limit=defaults.AGGREGATE_LIMIT,
+                 max_fingerprints=defaults.AGGREGATE_MAX_FINGERPRINTS):
+        self.window = window
+        self.limit = limit
+        self.max_fingerprints = max_fingerprints
+
+        self.sent = 0
+        self.suppressed = 0
+        self.summaries = 0
+        self.evicted = 0
+
+        self._lock = threading.Lock()
+        # fingerprint -> [last seen tick, window start, count, suppressed]
+        self._entries = {}
+        self._tick = 0
+        self._next_sweep = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_stats(self):
+        return {
+            'sent': self.sent,
+            'suppressed': self.suppressed,
+            'summaries': self.summaries,
+            'evicted': self.evicted,
+            'fingerprints': len(self._entries),
+        }
+
+    def record(self, fingerprint, now=None):
+        """
+        Records an event and returns a ``(send, summaries)`` tuple: whether
+        the event should be sent in full, and the summaries of windows
+        which have ended since and need to be sent.
+        """
+        if now is None:
+            now = time.time()
+
+        summaries = []
+        with self._lock:
+            self._tick += 1
+            entry = self._entries.get(fingerprint)
+            if entry is not None and now - entry[1] >= self.window:
+                self._summarize(fingerprint, entry, now, summaries)
+                entry = None
+
+            if entry is None:
+                if len(self._entries) >= self.max_fingerprints:
+                    self._evict(now, summaries)
+                entry = self._entries[fingerprint] = [self._tick, now, 0, 0]
+
+            entry[0] = self._tick
+            entry[2] += 1
+            send = entry[2] <= self.limit
+            if send:
+                self.sent += 1
+            else:
+                entry[3] += 1
+                self.suppressed += 1
+
+            if now >= self._next_sweep:
+                self._sweep(now, summaries)
+                self._next_sweep = now + self.window
+
+        return send, summaries
+
+    def flush(self, now=None):
+        """
+        Forgets all fingerprints and returns the summaries of the events
+        suppressed so far.
+        """
+        if now is None:
+            now = time.time()
+
+        summaries = []
+        with self._lock:
+            for fingerprint, entry in iteritems(self._entries):
+                self._summarize(fingerprint, entry, now, summaries)
+            self._entries = {}
+        return summaries
+
+    def _summarize(self, fingerprint, entry, now, summaries):
+        if entry[3]:
+            summaries.append(Summary(
+                fingerprint, entry[3], entry[1],
+                min(now, entry[1] + self.window)))
+            self.summaries += 1
+
+    def _sweep(self, now, summaries):
+        # windows of fingerprints which are not seen again would otherwise
+        # never be summarized
+        expired = [
+            (fingerprint, entry)
+            for fingerprint, entry in iteritems(self._entries)
+            if now - entry[1] >= self.window
+        ]
+        for fingerprint, entry in expired:
+            del self._entries[fingerprint]
+            self._summarize(fingerprint, entry, now, summaries)
+
+    def _evict(self, now, summaries):
+        by_age = sorted(iteritems(self._entries), key=lambda i: i[1][0])
+        count = max(1, int(self.max_fingerprints * EVICT_FRACTION))
+        for fingerprint, entry in by_age[:count]:
+            del self._entries[fingerprint]
+            self._summarize(fingerprint, entry, now, summaries)
+            self.evicted += 1
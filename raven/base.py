@@ -9,9 +9,12 @@ raven.base
 from __future__ import absolute_import
 
 import zlib
+import atexit
+import copy
 import logging
 import os
 import sys
+import threading
 import time
 import uuid
 import warnings
@@ -36,6 +39,7 @@ import raven
 from raven.conf import defaults
 from raven.conf.remote import RemoteConfig
 from raven.exceptions import APIError, RateLimited
+from raven.processors import ProcessorPipeline
 from raven.utils import json, get_versions, get_auth_header, merge_dicts
 from raven.utils.compat import text_type, iteritems
 from raven.utils.encoding import to_unicode
@@ -70,6 +74,34 @@ def get_excepthook_client():
     return getattr(sys.excepthook, 'raven_client', None)
 
 
+# stands in for values of the event skeleton which cannot be copied or
+# compared with their copy, and are therefore never considered unchanged
+_UNCACHEABLE = object()
+
+
+def _is_unchanged(value, cached):
+    # ``cached`` is a frozen copy, so even a value which is ``cached`` itself
+    # could have been changed in place since
+    try:
+        # anything but True, such as an array of comparisons, is a change
+        return (value == cached) is True
+    except Exception:
+        return False
+
+
+def _freeze(value):
+    # a copy which does not share anything that can be changed in place
+    # with the value it was made from; values without value equality (such
+    # as plain objects) never compare equal to it, so they are not kept
+    try:
+        frozen = copy.deepcopy(value)
+    except Exception:
+        return _UNCACHEABLE
+    if not _is_unchanged(value, frozen):
+        return _UNCACHEABLE
+    return frozen
+
+
 class ModuleProxyCache(dict):
     def __missing__(self, key):
         module, class_name = key.rsplit('.', 1)
@@ -82,6 +114,62 @@ class ModuleProxyCache(dict):
         return handler
 
 
+class EventSkeleton(object):
+    """
+    The parts of an event which only depend on the client configuration,
+    along with their JSON encoding.
+    """
+
+    __slots__ = ('key', 'defaults', 'overrides', 'extra', 'encoded')
+
+    def __init__(self, key, defaults, overrides):
+        self.key = key
+        # values used when the event does not carry its own
+        self.defaults = defaults
+        # values which always replace the event's own
+        self.overrides = overrides
+        # the client level extra context, as ``(frozen value, transformed)``
+        self.extra = {}
+
+        self.encoded = {}
+        for fields in (defaults, overrides):
+            for name, value in iteritems(fields):
+                self.encoded[name] = (
+                    _freeze(value), json.dumps({name: value})[1:-1])
+
+    def repos_is_unchanged(self, repos):
+        frozen = self.encoded['repos'][0]
+        if frozen is _UNCACHEABLE:
+            # the skeleton holds the client's own value, which is encoded
+            # for every event
+            return repos is self.defaults['repos']
+        return _is_unchanged(repos, frozen)
+
+    def update_extra(self, extra, transform):
+        """
+        Brings the client level extra context up to date with ``extra``,
+        copying and transforming again only the values which changed.
+        """
+        cached = self.extra
+        updated = {}
+        changed = len(extra) != len(cached)
+        for k, v in iteritems(extra):
+            entry = cached.get(k)
+            # values which cannot be compared are transformed for every
+            # event instead
+            if entry is None or (entry[0] is not _UNCACHEABLE
+                                 and not _is_unchanged(v, entry[0])):
+                frozen = _freeze(v)
+                entry = (frozen, None if frozen is _UNCACHEABLE
+                         else transform(v))
+                changed = True
+            updated[k] = entry
+        if changed:
+            # replaced rather than changed in place, as other threads may be
+            # reading it
+            self.extra = updated
+
+
 class ClientState(object):
     ONLINE = 1
     ERROR = 0
@@ -208,17 +296,93 @@ class Client(object):
             if o.get('sample_rate') is not None
             else 1
         )
+        self.sampler = o.get('sampler')
         self.transaction = TransactionStack()
         self.ignore_exceptions = set(o.get('ignore_exceptions') or ())
 
         self.module_cache = ModuleProxyCache()
+        self._skeleton = None
+        self._processor_pipeline = None
 
         self._random = Random(_random_seed)
 
+        self.spool = None
+        spool_dir = o.get('spool_dir')
+        if spool_dir:
+            from raven.spool import EventSpool
+            self.spool = EventSpool(
+                spool_dir,
+                max_bytes=int(o.get('spool_max_bytes') or defaults.SPOOL_MAX_BYTES),
+                max_age=int(o.get('spool_max_age') or defaults.SPOOL_MAX_AGE),
+                fsync=o.get('spool_fsync') or defaults.SPOOL_FSYNC,
+            )
+            atexit.register(self.spool.close)
+        # spooled events are replayed by a single thread at a time
+        self._replay_thread = None
+        self._replay_thread_lock = threading.Lock()
+
+        self.shared_state = None
+        shared_state = o.get('shared_state')
+        if shared_state:
+            from raven.shared import SharedState, SharedClientState
+            self.shared_state = SharedState(
+                shared_state,
+                slots=int(
+                    o.get('shared_state_slots')
+                    or defaults.SHARED_STATE_SLOTS),
+            )
+            self.state = SharedClientState(self.shared_state)
+
+        self.aggregator = None
+        aggregate_window = o.get('aggregate_window')
+        aggregate_limit = int(
+            o.get('aggregate_limit') or defaults.AGGREGATE_LIMIT)
+        if aggregate_window and self.shared_state is not None:
+            from raven.shared import SharedEventAggregator
+            self.aggregator = SharedEventAggregator(
+                self.shared_state,
+                window=float(aggregate_window),
+                limit=aggregate_limit,
+            )
+        elif aggregate_window:
+            from raven.aggregation import EventAggregator
+            self.aggregator = EventAggregator(
+                window=float(aggregate_window),
+                limit=aggregate_limit,
+                max_fingerprints=int(
+                    o.get('aggregate_max_fingerprints')
+                    or defaults.AGGREGATE_MAX_FINGERPRINTS),
+            )
+        if self.aggregator is not None:
+            # the last window of a storm is usually the one that matters
+            atexit.register(self._flush_aggregates_at_exit)
+
+        self.adaptive_sampler = None
+        sample_budget = o.get('sample_budget')
+        if sample_budget:
+            from raven.sampling import AdaptiveSampler
+            bucket_budget = o.get('sample_budget_per_fingerprint')
+            self.adaptive_sampler = AdaptiveSampler(
+                float(sample_budget),
+                bucket_rate=float(bucket_budget) if bucket_budget else None,
+                window=float(
+                    o.get('sample_budget_window')
+                    or defaults.SAMPLE_BUDGET_WINDOW),
+            )
+
+        self._versions_thread = None
         if not self.is_enabled():
             self.logger.info(
                 'Raven is not configured (logging is disabled). Please see the'
                 ' documentation for more information.')
+        elif (self.include_versions and self.include_paths
+              and o.get('preload_versions', True)):
+            # reading package metadata should not hold up the first event
+            self._versions_thread = threading.Thread(
+                target=self._preload_versions,
+                args=(list(self.include_paths),), name='raven.versions')
+            self._versions_thread.daemon = True
+            self._versions_thread.start()
 
         if Raven is None:
             Raven = self
@@ -296,8 +460,19 @@ class Client(object):
         cls._registry.register_scheme(scheme, transport_class)
 
     def get_processors(self):
-        for processor in self.processors:
-            yield self.module_cache[processor](self)
+        return self.get_processor_pipeline().processors
+
+    def get_processor_pipeline(self):
+        """
+        Returns the pipeline running the configured processors, which are
+        only instantiated again once ``processors`` changes.
+        """
+        names = tuple(self.processors)
+        pipeline = self._processor_pipeline
+        if pipeline is None or pipeline.names != names:
+            pipeline = self._processor_pipeline = ProcessorPipeline(
+                [self.module_cache[name](self) for name in names], names)
+        return pipeline
 
     def get_module_versions(self):
         if not self.include_versions:
@@ -305,13 +480,67 @@ class Client(object):
 
         version_info = sys.version_info
 
-        modules = get_versions(self.include_paths)
+        # while versions are looked up in the background only those which
+        # are known already are included
+        modules = get_versions(
+            self.include_paths, block=not self._loading_versions())
         modules['python'] = '{0}.{1}.{2}'.format(
             version_info[0], version_info[1], version_info[2],
         )
 
         return modules
 
+    def _preload_versions(self, module_list):
+        # modules are not imported here: they may only be importable once
+        # the application has finished setting up (e.g. Django apps), which
+        # is left to the first event
+        try:
+            get_versions(module_list, import_modules=False)
+        except Exception:
+            self.error_logger.exception('Unable to look up module versions')
+
+    def _loading_versions(self):
+        thread = self._versions_thread
+        return thread is not None and thread.is_alive()
+
+    def get_event_skeleton(self):
+        """
+        Returns the static parts of every event, which are only built again
+        once the configuration they are built from changes.
+        """
+        # shallow copies, so that the sets being changed in place is noticed
+        # too; repos is compared with a frozen copy, and the extra context is
+        # brought up to date value by value
+        key = (self.name, self.release, self.environment,
+               self.include_versions, tuple(self.include_paths),
+               self._loading_versions())
+
+        skeleton = self._skeleton
+        if (skeleton is not None and skeleton.key == key
+                and skeleton.repos_is_unchanged(self.repos)):
+            skeleton.update_extra(self.extra, self.transform)
+            return skeleton
+
+        overrides = {}
+        if self.release is not None:
+            overrides['release'] = self.release
+        if self.environment is not None:
+            overrides['environment'] = self.environment
+
+        skeleton = self._skeleton = EventSkeleton(
+            key,
+            defaults={
+                'server_name': self.name,
+                'modules': self.get_module_versions(),
+                'platform': PLATFORM_NAME,
+                'sdk': SDK_VALUE,
+                'repos': self.repos,
+            },
+            overrides=overrides,
+        )
+        skeleton.update_extra(self.extra, self.transform)
+        return skeleton
+
     def get_ident(self, result):
         """
         Returns a searchable string representing a message.
@@ -367,21 +596,29 @@ class Client(object):
 
     def record_exception_seen(self, exc_info):
         key = self._get_exception_key(exc_info)
-        self.context.exceptions_to_skip.add(key)
+        self.context.skip_exception(key)
 
     def build_msg(self, event_type, data=None, date=None,
                   time_spent=None, extra=None, stack=None, public_key=None,
-                  tags=None, fingerprint=None, **kwargs):
+                  tags=None, fingerprint=None, event_id=None,
+                  use_context=True, **kwargs):
         """
         Captures, processes and serializes an event into a dict object
 
         The result of ``build_msg`` should be a standardized dict, with
         all default values available.
+
+        With ``use_context=False`` the context, breadcrumbs and transaction
+        of the running request are left out of the event.
         """
         # create ID client-side so that it can be passed to application
-        event_id = uuid.uuid4().hex
+        if event_id is None:
+            event_id = uuid.uuid4().hex
 
-        data = merge_dicts(self.context.data, data)
+        if use_context:
+            data = merge_dicts(self.context.resolve(), data)
+        else:
+            data = merge_dicts(data)
 
         data.setdefault('tags', {})
         data.setdefault('extra', {})
@@ -419,6 +656,7 @@ class Client(object):
                 frames,
                 transformer=self.transform,
                 capture_locals=self.capture_locals,
+                in_app=self.is_in_app,
             )
             data.update({
                 'stacktrace': stack_info,
@@ -433,32 +671,25 @@ class Client(object):
                 if not path:
                     continue
 
-                if path.startswith('raven.'):
-                    frame['in_app'] = False
-                else:
-                    frame['in_app'] = (
-                        any(path.startswith(x) for x in self.include_paths)
-                        and not any(path.startswith(x) for x in self.exclude_paths)
-                    )
+                frame['in_app'] = self.is_in_app(path)
 
         transaction = None
-        if not culprit:
+        if not culprit and use_context:
             transaction = self.transaction.peek()
 
         if not data.get('level'):
             data['level'] = kwargs.get('level') or logging.ERROR
 
+        skeleton = self.get_event_skeleton()
+        defaults = skeleton.defaults
+
         if not data.get('server_name'):
-            data['server_name'] = self.name
+            data['server_name'] = defaults['server_name']
 
         if not data.get('modules'):
-            data['modules'] = self.get_module_versions()
-
-        if self.release is not None:
-            data['release'] = self.release
+            data['modules'] = defaults['modules']
 
-        if self.environment is not None:
-            data['environment'] = self.environment
+        data.update(skeleton.overrides)
 
         data['tags'] = merge_dicts(self.tags, data['tags'], tags)
         data['extra'] = merge_dicts(self.extra, data['extra'], extra)
@@ -477,8 +708,7 @@ class Client(object):
             data['fingerprint'] = fingerprint
 
         # Run the data through processors
-        for processor in self.get_processors():
-            data.update(processor.process(data))
+        self.get_processor_pipeline().process(data)
 
         if 'message' not in data:
             data['message'] = kwargs.get('message', handler.to_string(data))
@@ -487,21 +717,26 @@ class Client(object):
         for key, value in iteritems(data['tags']):
             data['tags'][key] = to_unicode(value)
 
-        # extra data can be any arbitrary value
+        # extra data can be any arbitrary value; client level values which
+        # processors left alone have been transformed already
+        static_extra = skeleton.extra
         for k, v in iteritems(data['extra']):
-            data['extra'][k] = self.transform(v)
+            if k in static_extra and _is_unchanged(v, static_extra[k][0]):
+                data['extra'][k] = static_extra[k][1]
+            else:
+                data['extra'][k] = self.transform(v)
 
         # It's important date is added **after** we serialize
         data.setdefault('project', self.remote.project)
         data.setdefault('timestamp', date or datetime.utcnow())
         data.setdefault('time_spent', time_spent)
         data.setdefault('event_id', event_id)
-        data.setdefault('platform', PLATFORM_NAME)
-        data.setdefault('sdk', SDK_VALUE)
-        data.setdefault('repos', self.repos)
+        data.setdefault('platform', defaults['platform'])
+        data.setdefault('sdk', defaults['sdk'])
+        data.setdefault('repos', defaults['repos'])
 
         # insert breadcrumbs
-        if self.enable_breadcrumbs:
+        if self.enable_breadcrumbs and use_context:
             crumbs = self.context.breadcrumbs.get_buffer()
             if crumbs:
                 # Make sure we send the crumbs here as "values" as we use the
@@ -538,6 +773,9 @@ class Client(object):
         Update the user context for future events.
 
         >>> client.user_context({'email': 'foo@example.com'})
+
+        ``data`` may also be a callable returning the dict, in which case it
+        is only called when an event is captured.
         """
         return self.context.merge({
             'user': data,
@@ -548,6 +786,11 @@ class Client(object):
         Update the http context for future events.
 
         >>> client.http_context({'url': 'http://example.com'})
+
+        ``data`` may also be a callable returning the dict, in which case it
+        is only called when an event is captured:
+
+        >>> client.http_context(lambda: get_http_info(request))
         """
         return self.context.merge({
             'request': data,
@@ -641,20 +884,178 @@ class Client(object):
                 return
             self.record_exception_seen(exc_info)
 
+        # the ID is created up front so that events which are sampled out
+        # still return a stable identifier
+        event_id = (data or {}).get('event_id') or uuid.uuid4().hex
+
+        fingerprint = None
+        if self.aggregator is not None or (
+                self.adaptive_sampler is not None
+                and self.adaptive_sampler.bucket_rate is not None):
+            fingerprint = self.get_event_fingerprint(
+                event_type, data, exc_info, kwargs.get('message'))
+
+        if self.aggregator is not None and not self._aggregate(fingerprint):
+            self._local_state.last_event_id = event_id
+            return event_id
+
+        # decide whether this event is sampled before paying for building it
+        applied_rate = self.should_sample(
+            event_type, data, exc_info, sample_rate, fingerprint)
+        if applied_rate:
+            if applied_rate < 1:
+                # allows the number of captured events to be reconstructed
+                extra = merge_dicts(extra, {'sample_rate': applied_rate})
+            data = self.build_msg(
+                event_type, data, date, time_spent, extra, stack, tags=tags,
+                event_id=event_id, **kwargs)
+            self.send(**data)
+
+        self._local_state.last_event_id = event_id
+
+        return event_id
+
+    def get_event_fingerprint(self, event_type, data=None, exc_info=None,
+                              message=None):
+        """
+        Returns a fingerprint of an event which is cheap to compute before
+        the event is built, or None.
+
+        Exceptions are identified by their type and the innermost in-app
+        frame of their traceback, messages by their logger and template.
+        """
+        if exc_info is not None and exc_info[0] is not None:
+            exc_type, tb = exc_info[0], exc_info[2]
+            innermost = in_app = None
+            while tb is not None:
+                frame = tb.tb_frame
+                innermost = (frame.f_code.co_filename, tb.tb_lineno)
+                module = frame.f_globals.get('__name__')
+                if module and self.is_in_app(module):
+                    in_app = innermost
+                tb = tb.tb_next
+
+            location = in_app or innermost
+            return '%s.%s at %s' % (
+                getattr(exc_type, '__module__', None),
+                getattr(exc_type, '__name__', exc_type),
+                '%s:%s' % location if location else '<unknown>')
+
+        if message is not None and event_type.endswith('Message'):
+            return '%s: %s' % ((data or {}).get('logger') or '',
+                               to_unicode(message))
+
+        return None
+
+    def _aggregate(self, fingerprint):
+        # returns whether the event should be sent
+        if fingerprint is None:
+            return True
+
+        send, summaries = self.aggregator.record(fingerprint)
+        for summary in summaries:
+            self._send_summary(summary)
+        return send
+
+    def flush_aggregates(self):
+        """
+        Sends the summaries of all events suppressed by aggregation so far.
+        """
+        if self.aggregator is None:
+            return
+        for summary in self.aggregator.flush():
+            self._send_summary(summary)
+
+    def _flush_aggregates_at_exit(self):
+        # atexit handlers run in reverse order of registration, so the
+        # worker of an asynchronous transport may have been shut down
+        # already; the summaries are sent synchronously instead
+        transport = self.remote.get_transport()
+        for summary in self.aggregator.flush():
+            data = self._build_summary(summary)
+            if data is None:
+                continue
+            if transport is None or not transport.is_async:
+                self.send(**data)
+                continue
+            message = self.encode(data)
+            exc = None
+            if self.state.should_try():
+                exc = self._send_blocking(message)
+                if exc is None:
+                    continue
+            if self.spool is not None and (
+                    exc is None or self._should_spool(exc)):
+                self.spool.append(message)
+
+    def _send_summary(self, summary):
+        data = self._build_summary(summary)
+        if data is not None:
+            self.send(**data)
+
+    def _build_summary(self, summary):
+        if not self.is_enabled():
+            return None
+
+        def format_time(timestamp):
+            return datetime.utcfromtimestamp(timestamp).strftime(
+                '%Y-%m-%dT%H:%M:%SZ')
+
         data = self.build_msg(
-            event_type, data, date, time_spent, extra, stack, tags=tags,
-            **kwargs)
+            'raven.events.Message',
+            data={'level': logging.WARNING, 'logger': 'raven.aggregation'},
+            extra={
+                'fingerprint': summary.fingerprint,
+                'suppressed': summary.count,
+                'window_start': format_time(summary.start),
+                'window_end': format_time(summary.end),
+            },
+            fingerprint=['raven.aggregation', summary.fingerprint],
+            stack=False,
+            # the summary has nothing to do with the request which happened
+            # to end the window
+            use_context=False,
+            message='Suppressed %s duplicate events of %s',
+            params=(summary.count, summary.fingerprint),
+            formatted='Suppressed %s duplicate events of %s' % (
+                summary.count, summary.fingerprint),
+        )
+        return data
+
+    def should_sample(self, event_type, data=None, exc_info=None,
+                      sample_rate=None, fingerprint=None):
+        """
+        Decides whether an event should be sent. This runs before the event
+        is built, so it can only look at what was passed to ``capture``.
 
-        # should this event be sampled?
+        Returns the overall rate the event was sampled with, or 0 if it
+        should be dropped.
+
+        If a ``sampler`` callable is configured it is called as
+        ``sampler(event_type, logger, exc_type, sample_rate)`` and returns
+        the sample rate to apply to this event. Events which pass are then
+        sampled again to stay within the ``sample_budget``, per
+        ``fingerprint`` if ``sample_budget_per_fingerprint`` is set.
+        """
         if sample_rate is None:
             sample_rate = self.sample_rate
 
-        if self._random.random() < sample_rate:
-            self.send(**data)
+        if self.sampler is not None:
+            logger = (data or {}).get('logger')
+            exc_type = exc_info[0] if exc_info else None
+            sample_rate = self.sampler(event_type, logger, exc_type, sample_rate)
 
-        self._local_state.last_event_id = data['event_id']
+        if sample_rate < 1 and self._random.random() >= sample_rate:
+            return 0
+        sample_rate = min(sample_rate, 1)
 
-        return data['event_id']
+        if self.adaptive_sampler is not None:
+            rate = self.adaptive_sampler.get_rate(fingerprint)
+            if rate < 1 and self._random.random() >= rate:
+                return 0
+            sample_rate *= rate
+
+        return sample_rate
 
     def is_enabled(self):
         """
@@ -663,6 +1064,21 @@ class Client(object):
         """
         return self.remote.is_active()
 
+    def is_in_app(self, module):
+        """
+        Returns whether frames from ``module`` belong to the application
+        according to ``include_paths`` and ``exclude_paths``, or None when
+        no ``include_paths`` are configured.
+        """
+        if not self.include_paths:
+            return None
+        if module.startswith('raven.'):
+            return False
+        return (
+            any(module.startswith(x) for x in self.include_paths)
+            and not any(module.startswith(x) for x in self.exclude_paths)
+        )
+
     def _iter_frames(self, data):
         if 'stacktrace' in data:
             for frame in data['stacktrace']['frames']:
@@ -673,6 +1089,42 @@ class Client(object):
 
     def _successful_send(self):
         self.state.set_success()
+        if self.spool is not None and self.spool.has_pending():
+            with self._replay_thread_lock:
+                thread = self._replay_thread
+                if thread is not None and thread.is_alive():
+                    return
+                thread = self._replay_thread = threading.Thread(
+                    target=self.spool.replay, args=(self._replay_spooled,),
+                    name='raven.EventSpool')
+                thread.daemon = True
+                thread.start()
+
+    def _replay_spooled(self, message):
+        # sent through the blocking path of the transport, as asynchronous
+        # transports only queue the event, and may drop it when full
+        if not self.state.should_try():
+            return False
+
+        exc = self._send_blocking(message)
+        # an event the server rejected is dropped rather than kept
+        return exc is None or not self._should_spool(exc)
+
+    def _send_blocking(self, message):
+        # returns the exception sending ``message`` failed with, if any
+        url = self.remote.store_endpoint
+        try:
+            self.remote.get_transport().send(
+                url, message, self._get_headers())
+        except Exception as e:
+            self._failed_send(e, url, self.decode(message))
+            return e
+        self.state.set_success()
+        return None
+
+    def _should_spool(self, exc):
+        # an event the server rejected will be rejected again
+        return not isinstance(exc, APIError) or isinstance(exc, RateLimited)
 
     def _failed_send(self, exc, url, data):
         retry_after = 0
@@ -719,6 +1171,9 @@ class Client(object):
             headers = {}
 
         if not self.raise_send_errors and not self.state.should_try():
+            if self.spool is not None:
+                self.spool.append(data)
+                return
             data = self.decode(data)
             self._log_failed_submission(data)
             return
@@ -726,6 +1181,8 @@ class Client(object):
         self.logger.debug('Sending message of length %d to %s', len(data), url)
 
         def failed_send(e):
+            if self.spool is not None and self._should_spool(e):
+                self.spool.append(data)
             self._failed_send(e, url, self.decode(data))
 
         try:
@@ -754,6 +1211,14 @@ class Client(object):
         Given an already serialized message, signs the message and passes the
         payload off to ``send_remote``.
         """
+        return self.send_remote(
+            url=self.remote.store_endpoint,
+            data=message,
+            headers=self._get_headers(auth_header),
+            **kwargs
+        )
+
+    def _get_headers(self, auth_header=None):
         client_string = 'raven-python/%s' % (raven.VERSION,)
 
         if not auth_header:
@@ -766,20 +1231,13 @@ class Client(object):
                 api_secret=self.remote.secret_key,
             )
 
-        headers = {
+        return {
             'User-Agent': client_string,
             'X-Sentry-Auth': auth_header,
             'Content-Encoding': self.get_content_encoding(),
             'Content-Type': 'application/octet-stream',
         }
 
-        return self.send_remote(
-            url=self.remote.store_endpoint,
-            data=message,
-            headers=headers,
-            **kwargs
-        )
-
     def get_content_encoding(self):
         return 'deflate'
 
@@ -787,7 +1245,31 @@ class Client(object):
         """
         Serializes ``data`` into a raw string.
         """
-        return zlib.compress(json.dumps(data).encode('utf8'))
+        return zlib.compress(self._dumps(data).encode('utf8'))
+
+    def _dumps(self, data):
+        skeleton = self._skeleton
+        if skeleton is None:
+            return json.dumps(data)
+
+        # values which are still those of the event skeleton are spliced in
+        # already encoded
+        fragments = []
+        rest = data
+        for name, (value, encoded) in iteritems(skeleton.encoded):
+            if name not in data:
+                continue
+            if _is_unchanged(data[name], value):
+                if rest is data:
+                    rest = dict(data)
+                del rest[name]
+                fragments.append(encoded)
+
+        if not fragments:
+            return json.dumps(data)
+        if not rest:
+            return '{%s}' % ', '.join(fragments)
+        return '{%s, %s' % (', '.join(fragments), json.dumps(rest)[1:])
 
     def decode(self, data):
         """
@@ -913,7 +1395,7 @@ class Client(object):
         # Note: framework integration should not call this method but
         # instead use the raven.breadcrumbs.record_breadcrumb function
         # which will record to the correct client automatically.
-        self.context.breadcrumbs.record(*args, **kwargs)
+        self.context.record_breadcrumb(*args, **kwargs)
 
     capture_breadcrumb = captureBreadcrumb
 
@@ -1,6 +1,8 @@
 from __future__ import absolute_import
 
 import os
+import sys
+import itertools
 import logging
 
 try:
@@ -8,20 +10,30 @@ try:
 except ImportError:
     # Python < 3.3
     from collections import Mapping
+from collections import deque
 from time import time
 from types import FunctionType
 
+from raven.conf import defaults
 from raven.utils import once
 from raven.utils.encoding import to_unicode
-from raven.utils.compat import iteritems, get_code, text_type, string_types
+from raven.utils.compat import (
+    iteritems, get_code, text_type, string_types, binary_type, integer_types
+)
 
 CATEGORY_MAX_LENGTH = 128
 
 LEVEL_MAX_LENGTH = 16
 
+MESSAGE_MAX_LENGTH = 1024
+
 special_logging_handlers = []
 special_logger_handlers = {}
 
+# logger name -> lowest level that is recorded for it according to
+# ``ignore_logger``. Cleared whenever special log handlers change.
+_logger_min_levels = {}
+
 logger = logging.getLogger('raven')
 
 
@@ -35,37 +47,270 @@ def event_payload_considered_equal(a, b):
     )
 
 
+# rough size of a breadcrumb record, on top of its message, category and data
+CRUMB_OVERHEAD = 200
+
+
+_text_types = (text_type, binary_type) + tuple(string_types)
+_text_classes = frozenset(_text_types)
+_scalar_classes = frozenset((int, float, bool, type(None)) + integer_types)
+_collection_types = (list, tuple, set, frozenset)
+
+
+def _estimate_size(value, limit, depth=0):
+    """Cheaply estimates how many bytes ``value`` takes up.  Stops counting
+    once ``limit`` is exceeded.
+    """
+    if isinstance(value, _text_types):
+        return len(value)
+    if depth > 8:
+        return 0
+
+    # exact class checks first, as nearly all data is flat text and numbers
+    size = 0
+    if isinstance(value, dict):
+        for k, v in iteritems(value):
+            size += len(k) if k.__class__ in _text_classes else 8
+            cls = v.__class__
+            if cls in _text_classes:
+                size += len(v)
+            elif cls in _scalar_classes:
+                size += 8
+            else:
+                size += _estimate_size(v, limit - size, depth + 1)
+            if size > limit:
+                break
+    elif isinstance(value, _collection_types):
+        for v in value:
+            cls = v.__class__
+            if cls in _text_classes:
+                size += len(v)
+            elif cls in _scalar_classes:
+                size += 8
+            else:
+                size += _estimate_size(v, limit - size, depth + 1)
+            if size > limit:
+                break
+    else:
+        size = 8
+    return size
+
+
+def _trim(value, string_max_length, list_max_length, depth=0):
+    """Returns ``value`` with strings and collections cut down to the given
+    lengths, like the serializer does for event data.
+    """
+    if isinstance(value, _text_types):
+        return value[:string_max_length]
+    if depth > 8:
+        return None
+    if isinstance(value, dict):
+        return dict(
+            (k, _trim(v, string_max_length, list_max_length, depth + 1))
+            for k, v in itertools.islice(iteritems(value), list_max_length))
+    if isinstance(value, _collection_types):
+        return [_trim(v, string_max_length, list_max_length, depth + 1)
+                for v in itertools.islice(value, list_max_length)]
+    return value
+
+
+def _truncate(value, max_length):
+    if value.__class__ is not text_type:
+        value = to_unicode(value)
+    if len(value) > max_length:
+        return value[:max_length]
+    return value
+
+
+class Breadcrumb(object):
+    """
+    A recorded breadcrumb. Crumbs are only turned into dictionaries when
+    an event is sent, so they are kept in this compact form until then.
+    """
+    __slots__ = ('type', 'timestamp', 'level', 'message', 'category', 'data',
+                 'processor', 'size', 'key', 'repeat_count', 'first_timestamp')
+
+    def __init__(self, type, timestamp, level, message, category, data,
+                 processor, size=0, key=None):
+        self.type = type
+        self.timestamp = timestamp
+        self.level = level
+        self.message = message
+        self.category = category
+        self.data = data
+        self.processor = processor
+        self.size = size
+        # identifies crumbs that are coalesced into this one
+        self.key = key
+        self.repeat_count = 1
+        self.first_timestamp = timestamp
+
+    def matches(self, type, level, message, category, data, key):
+        if key is not None or self.key is not None:
+            # the key stands in for what the processor is given, data
+            # passed along with it still has to be the same
+            fields = (self.key, self.data)
+            other = (key, data)
+        elif self.processor is not None:
+            # we cannot know what the processor will turn this crumb into
+            return False
+        else:
+            fields = (self.type, self.level, self.message, self.category,
+                      self.data)
+            other = (type, level, message, category, data)
+        try:
+            return bool(fields == other)
+        except Exception:
+            return False
+
+    def copy(self):
+        rv = Breadcrumb(self.type, self.timestamp, self.level, self.message,
+                        self.category, self.data, self.processor, self.size,
+                        self.key)
+        rv.repeat_count = self.repeat_count
+        rv.first_timestamp = self.first_timestamp
+        return rv
+
+    def to_dict(self):
+        return {
+            'type': self.type,
+            'timestamp': self.timestamp,
+            'level': self.level,
+            'message': self.message,
+            'category': self.category,
+            'data': self.data,
+        }
+
+    def update(self, payload):
+        self.type = payload.get('type')
+        self.timestamp = payload.get('timestamp')
+        self.level = payload.get('level')
+        self.message = payload.get('message')
+        self.category = payload.get('category')
+        self.data = payload.get('data')
+
+
 class BreadcrumbBuffer(object):
 
-    def __init__(self, limit=100, message_max_length=1024):
-        self.buffer = []
+    def __init__(self, limit=100, message_max_length=MESSAGE_MAX_LENGTH,
+                 data_max_bytes=defaults.BREADCRUMB_DATA_MAX_BYTES,
+                 max_bytes=defaults.BREADCRUMBS_MAX_BYTES):
+        # the deque drops the oldest crumb once ``limit`` is reached
+        self.buffer = deque(maxlen=limit)
         self.limit = limit
         self.message_max_length = message_max_length
+        self.data_max_bytes = data_max_bytes
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        # crumbs whose data was trimmed, and by roughly how many bytes
+        self.trimmed_crumbs = 0
+        self.trimmed_bytes = 0
+        # crumbs dropped early to keep the buffer within ``max_bytes``
+        self.dropped_crumbs = 0
 
     def record(self, timestamp=None, level=None, message=None,
-               category=None, data=None, type=None, processor=None):
+               category=None, data=None, type=None, processor=None,
+               key=None, size=0):
+        """Records a breadcrumb.  A crumb that repeats the previous one is
+        coalesced into it instead, which only bumps its repeat count and
+        timestamp.  Crumbs with a `processor` are only coalesced if they
+        are recorded with the same `key` and `data`.  `size` is roughly how many bytes
+        the processor holds on to, which counts towards `max_bytes` until
+        it has run.
+        """
         if not (message or data or processor):
             raise ValueError('You must pass either `message`, `data`, '
                              'or `processor`')
         if timestamp is None:
             timestamp = time()
+        type = type or 'default'
 
         # we format here to ensure we dont bloat memory due to message size
-        result = (self.format({
-            'type': type or 'default',
-            'timestamp': float(timestamp),
-            'level': level,
+        size += CRUMB_OVERHEAD
+        if message:
             # hardcode message length to prevent huge crumbs
-            'message': message,
-            'category': category,
-            # TODO(dcramer): we should trim data
-            'data': data,
-        }), processor)
-        self.buffer.append(result)
-        del self.buffer[:-self.limit]
+            message = _truncate(message, self.message_max_length)
+            size += len(message)
+        if data:
+            data, data_size = self.trim_data(data)
+            size += data_size
+        if level:
+            level = _truncate(level, LEVEL_MAX_LENGTH).lower()
+        if category:
+            category = _truncate(category, CATEGORY_MAX_LENGTH)
+        buffer = self.buffer
+        if buffer and (processor is None or key is not None):
+            last = buffer[-1]
+            if last.matches(type, level or None, message or None,
+                            category or None, data, key):
+                last.repeat_count += 1
+                last.timestamp = float(timestamp)
+                return
+
+        crumb = Breadcrumb(
+            type,
+            float(timestamp),
+            level or None,
+            message or None,
+            category or None,
+            data,
+            processor,
+            size,
+            key,
+        )
+
+        if len(buffer) == buffer.maxlen:
+            self.bytes -= buffer[0].size
+        buffer.append(crumb)
+        self.bytes += crumb.size
+        self.enforce_max_bytes()
+
+    def enforce_max_bytes(self):
+        """Drops the oldest crumbs until the buffer is within `max_bytes`.
+        The newest crumb is always kept.
+        """
+        buffer = self.buffer
+        while self.bytes > self.max_bytes and len(buffer) > 1:
+            self.bytes -= buffer.popleft().size
+            self.dropped_crumbs += 1
+
+    def trim_data(self, data):
+        """Returns ``data`` trimmed to roughly ``data_max_bytes``, and its
+        estimated size.  Strings and collections are cut down to the
+        serializer's default limits first, and further until they fit.
+        """
+        size = _estimate_size(data, self.data_max_bytes)
+        if size <= self.data_max_bytes:
+            return data, size
+
+        string_max_length = defaults.MAX_LENGTH_STRING
+        list_max_length = defaults.MAX_LENGTH_LIST
+        while True:
+            trimmed = _trim(data, string_max_length, list_max_length)
+            trimmed_size = _estimate_size(trimmed, self.data_max_bytes)
+            if trimmed_size <= self.data_max_bytes or list_max_length <= 1:
+                break
+            string_max_length = max(string_max_length // 2, 16)
+            list_max_length //= 2
+
+        self.trimmed_crumbs += 1
+        self.trimmed_bytes += max(size - trimmed_size, 0)
+        return trimmed, trimmed_size
 
     def clear(self):
-        del self.buffer[:]
+        self.buffer.clear()
+        self.bytes = 0
+
+    def copy(self):
+        rv = self.__class__(self.limit, self.message_max_length,
+                            self.data_max_bytes, self.max_bytes)
+        rv.buffer.extend(self.buffer)
+        if rv.buffer:
+            # the last crumb is the only one that is still modified when
+            # later crumbs are coalesced into it
+            rv.buffer[-1] = rv.buffer[-1].copy()
+        rv.bytes = self.bytes
+        return rv
 
     def format(self, result):
         result['message'] = to_unicode(result['message'])[:self.message_max_length] if result['message'] else None
@@ -74,24 +319,62 @@ class BreadcrumbBuffer(object):
         return result
 
     def get_buffer(self):
+        # crumb records may be shared with copies of this buffer, so
+        # processed crumbs replace them instead of being changed in place
+        processed = None
+        for idx, crumb in enumerate(self.buffer):
+            if crumb.processor is None:
+                continue
+            if processed is None:
+                processed = list(self.buffer)
+            payload = crumb.to_dict()
+            try:
+                crumb.processor(payload)
+            except Exception:
+                raise
+                logger.exception('Failed to process breadcrumbs. Ignored')
+                payload = None
+            else:
+                # we format here to ensure we dont bloat memory due to message size
+                payload = self.format(payload) if payload else None
+            if payload is None:
+                processed[idx] = None
+                self.bytes -= crumb.size
+                continue
+
+            # the processed crumb replaces what the processor held on to
+            size = CRUMB_OVERHEAD
+            if payload.get('message'):
+                size += len(payload['message'])
+            if payload.get('data'):
+                payload['data'], data_size = self.trim_data(payload['data'])
+                size += data_size
+            self.bytes += size - crumb.size
+            # processors only run once
+            crumb = processed[idx] = crumb.copy()
+            crumb.processor = None
+            crumb.size = size
+            crumb.update(payload)
+
+        if processed is not None:
+            self.buffer.clear()
+            self.buffer.extend(c for c in processed if c is not None)
+        # processed crumbs may have grown past the budget
+        self.enforce_max_bytes()
+
         rv = []
-        for idx, (payload, processor) in enumerate(self.buffer):
-            if processor is not None:
-                try:
-                    processor(payload)
-                except Exception:
-                    raise
-                    logger.exception('Failed to process breadcrumbs. Ignored')
-                    payload = None
-                else:
-                    # we format here to ensure we dont bloat memory due to message size
-                    payload = self.format(payload) if payload else None
-                self.buffer[idx] = (payload, None)
-            elif payload is not None:
-                payload = self.format(payload)
-
-            if payload is not None and \
-               (not rv or not event_payload_considered_equal(rv[-1], payload)):
+        for crumb in self.buffer:
+            payload = crumb.to_dict()
+            if crumb.repeat_count > 1:
+                data = payload.get('data')
+                if data is None or isinstance(data, dict):
+                    payload['data'] = dict(
+                        data or (),
+                        repeat_count=crumb.repeat_count,
+                        first_timestamp=crumb.first_timestamp,
+                    )
+
+            if not rv or not event_payload_considered_equal(rv[-1], payload):
                 rv.append(payload)
         return rv
 
@@ -114,16 +397,59 @@ def record_breadcrumb(type, *args, **kwargs):
 
 
 def record(message=None, timestamp=None, level=None, category=None,
-           data=None, type=None, processor=None):
+           data=None, type=None, processor=None, key=None, size=0):
     """Records a breadcrumb for all active clients.  This is what integration
     code should use rather than invoking the `captureBreadcrumb` method
     on a specific client.
+
+    Crumbs recorded with a `processor` are coalesced with the previous crumb
+    if both were given the same `key`.  `size` is roughly how many bytes the
+    processor holds on to until it runs.
     """
     if timestamp is None:
         timestamp = time()
     for ctx in raven.context.get_active_contexts():
-        ctx.breadcrumbs.record(timestamp, level, message, category,
-                               data, type, processor)
+        ctx.record_breadcrumb(timestamp, level, message, category,
+                              data, type, processor, key, size)
+
+
+def _get_logger_min_level(logger):
+    min_level = _logger_min_levels.get(logger.name)
+    if min_level is None:
+        handler = special_logger_handlers.get(logger.name)
+        # custom handlers have to be called to know what they ignore
+        min_level = getattr(handler, 'min_level', logging.NOTSET)
+        _logger_min_levels[logger.name] = min_level
+    # levels are read on every call: they can be changed through
+    # ``logging.disable``, ``dictConfig`` or by assigning ``level``, none of
+    # which go through ``Logger.setLevel``
+    disabled = logger.manager.disable
+    if disabled >= min_level:
+        min_level = disabled + 1
+    # levels disabled on the logger or one of its parents are not
+    # recorded.  The root logger is skipped: its level only decides
+    # what is emitted, and breadcrumbs are recorded below it.
+    level = logger.level
+    logger = logger.parent
+    while not level and logger is not None:
+        level = logger.level
+        logger = logger.parent
+    if logger is None or level < min_level:
+        return min_level
+    return level
+
+
+def _format_log_message(msg, format_args):
+    formatted_msg = msg
+    # If people log bad things, this can happen.  Then just don't do
+    # anything.
+    try:
+        formatted_msg = text_type(msg)
+        if format_args:
+            formatted_msg = msg % format_args
+    except Exception:
+        pass
+    return formatted_msg
 
 
 def _record_log_breadcrumb(logger, level, msg, *args, **kwargs):
@@ -135,40 +461,44 @@ def _record_log_breadcrumb(logger, level, msg, *args, **kwargs):
     if handler is not None and handler(logger, level, msg, args, kwargs):
         return
 
-    def processor(data):
-        formatted_msg = msg
-        format_args = args
-
-        # Extract 'extra' key from kwargs and merge into data
-        extra = kwargs.pop('extra', {})
-        data_value = kwargs
-        data_value.update(extra)
-
-        if args and len(args) == 1 and isinstance(args[0], Mapping) and args[0]:
-            format_args = args[0]
-            data_value.update(format_args)
-
-        # If people log bad things, this can happen.  Then just don't do
-        # anything.
-        try:
-            formatted_msg = text_type(msg)
-            if format_args:
-                formatted_msg = msg % format_args
-        except Exception:
-            pass
-
-        # We do not want to include exc_info as argument because it often
-        # lies (set to a constant value like 1 or True) or even if it's a
-        # tuple it will not be particularly useful for us as we cannot
-        # process it anyways.
-        kwargs.pop('exc_info', None)
-        data.update({
-            'message': formatted_msg,
+    # the data is put together now rather than by the processor, so that
+    # it is trimmed and counted against the buffer's budget when recorded
+    data = kwargs
+    format_args = args
+    extra = data.pop('extra', None)
+    if extra:
+        data.update(extra)
+    if args and len(args) == 1 and isinstance(args[0], Mapping) and args[0]:
+        format_args = args[0]
+        data.update(format_args)
+
+    # We do not want to include exc_info as argument because it often
+    # lies (set to a constant value like 1 or True) or even if it's a
+    # tuple it will not be particularly useful for us as we cannot
+    # process it anyways.
+    data.pop('exc_info', None)
+
+    # formatting is left to the processor, unless the message and its
+    # arguments are too large to hold on to until an event is sent
+    key_args = args
+    max_bytes = defaults.BREADCRUMB_DATA_MAX_BYTES
+    size = _estimate_size(args, max_bytes)
+    size += len(msg) if msg.__class__ in _text_classes else 8
+    if size > max_bytes:
+        msg = _truncate(_format_log_message(msg, format_args),
+                        MESSAGE_MAX_LENGTH)
+        format_args = key_args = None
+        size = len(msg)
+
+    def processor(payload):
+        payload.update({
+            'message': _format_log_message(msg, format_args),
             'category': logger.name,
             'level': logging.getLevelName(level).lower(),
-            'data': data_value,
         })
-    record(processor=processor)
+    # repeated log calls are coalesced without formatting them
+    record(processor=processor, data=data, size=size,
+           key=(logger.name, level, msg, key_args))
 
 
 def _wrap_logging_method(meth, level=None):
@@ -184,6 +514,7 @@ def _wrap_logging_method(meth, level=None):
     if level is None:
         args = ('level', 'msg')
         fwd = 'level, msg'
+        level = 'level'
     else:
         args = ('msg',)
         fwd = '%d, msg' % level
@@ -209,14 +540,23 @@ def _wrap_logging_method(meth, level=None):
     # refer to our own functions (original and the crumb recording
     # function) through a closure instead of the global scope.
     #
+    # Calls for levels the logger has disabled, or that are ignored through
+    # `ignore_logger`, return before doing anything else.  What
+    # `ignore_logger` lets through is cached per logger.
+    #
     # We also add a lot of newlines in front of the code so that the
     # code location lines up again in case someone runs inspect.getsource
     # on the function.
     ns = {}
     eval(compile('''%(offset)sif 1:
-    def factory(original, record_crumb):
+    def factory(original, get_min_level, record_crumb):
         def %(name)s(self, %(args)s, *args, **kwargs):
-            record_crumb(self, %(fwd)s, *args, **kwargs)
+            try:
+                enabled = %(level)s >= get_min_level(self)
+            except TypeError:
+                enabled = True
+            if enabled:
+                record_crumb(self, %(fwd)s, *args, **kwargs)
             return original(self, %(args)s, *args, **kwargs)
         return %(name)s
     \n''' % {
@@ -227,7 +567,8 @@ def _wrap_logging_method(meth, level=None):
         'level': level,
     }, logging_srcfile, 'exec'), logging.__dict__, ns)
 
-    new_func = ns['factory'](meth, _record_log_breadcrumb)
+    new_func = ns['factory'](meth, _get_logger_min_level,
+                             _record_log_breadcrumb)
     new_func.__doc__ = func.__doc__
 
     assert code.co_firstlineno == get_code(func).co_firstlineno
@@ -280,6 +621,8 @@ def ignore_logger(name_or_logger, allow_level=None):
            level >= allow_level:
             return False
         return True
+    # lets the logging hook skip ignored calls without calling the handler
+    handler.min_level = sys.maxsize if allow_level is None else allow_level
     register_special_log_handler(name_or_logger, handler)
 
 
@@ -297,6 +640,7 @@ def register_special_log_handler(name_or_logger, callback):
     else:
         name = name_or_logger.name
     special_logger_handlers[name] = callback
+    _logger_min_levels.clear()
 
 
 def register_logging_handler(callback):
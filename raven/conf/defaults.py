@@ -25,12 +25,57 @@ CLIENT = 'raven.contrib.django.DjangoClient'
 # will set it to None and require it passed in to ``Client`` on initializtion.
 NAME = socket.gethostname() if hasattr(socket, 'gethostname') else None
 
+# The number of idle keep-alive connections kept per host by HTTP transports
+# when ``keepalive`` is enabled.
+POOL_CONNECTIONS = 4
+
+# Seconds after which an idle keep-alive connection is discarded.
+POOL_IDLE_TIMEOUT = 60
+
+# The maximum size in bytes of the on-disk event spool (``spool_dir``).
+SPOOL_MAX_BYTES = 50 * 1024 * 1024
+
+# Spooled events older than this many seconds are discarded.
+SPOOL_MAX_AGE = 24 * 60 * 60
+
+# When to fsync the event spool: 'never', 'segment' or 'always'.
+SPOOL_FSYNC = 'segment'
+
+# The number of seconds over which duplicate events are aggregated when
+# ``aggregate_window`` is enabled.
+AGGREGATE_WINDOW = 60
+
+# The number of duplicate events sent in full per aggregation window.
+AGGREGATE_LIMIT = 10
+
+# The maximum number of event fingerprints tracked for aggregation.
+AGGREGATE_MAX_FINGERPRINTS = 1000
+
+# The number of seconds over which the rate of events is averaged when a
+# ``sample_budget`` is configured.
+SAMPLE_BUDGET_WINDOW = 10
+
+# The maximum number of event fingerprints tracked for
+# ``sample_budget_per_fingerprint``.
+SAMPLE_BUDGET_MAX_BUCKETS = 1000
+
+# The number of event fingerprints the table shared between processes
+# (``shared_state``) has room for.
+SHARED_STATE_SLOTS = 1024
+
 # The maximum number of elements to store for a list-like structure.
 MAX_LENGTH_LIST = 50
 
 # The maximum length to store of a string-like structure.
 MAX_LENGTH_STRING = 400
 
+# The approximate size in bytes a breadcrumb's ``data`` may take up before it
+# is trimmed.
+BREADCRUMB_DATA_MAX_BYTES = 4 * 1024
+
+# The approximate size in bytes of all breadcrumbs kept per thread.
+BREADCRUMBS_MAX_BYTES = 128 * 1024
+
 # Automatically log frame stacks from all ``logging`` messages.
 AUTO_LOG_STACKS = False
 
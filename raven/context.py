@@ -7,6 +7,8 @@ raven.context
 """
 from __future__ import absolute_import
 
+import logging
+
 try:
     from collections.abc import Mapping, Iterable
 except ImportError:
@@ -16,6 +18,7 @@ from threading import local
 from weakref import ref as weakref
 
 from raven.utils.compat import iteritems
+from raven.utils.contextlocal import ContextLocal
 
 try:
     from thread import get_ident as get_thread_ident
@@ -23,6 +26,8 @@ except ImportError:
     from _thread import get_ident as get_thread_ident
 
 
+logger = logging.getLogger('sentry.errors')
+
 _active_contexts = local()
 
 
@@ -34,10 +39,29 @@ def get_active_contexts():
         return []
 
 
-class Context(local, Mapping, Iterable):
+class _ContextState(object):
+    __slots__ = ('data', 'exceptions_to_skip', 'breadcrumbs')
+
+    def __init__(self, data, exceptions_to_skip, breadcrumbs):
+        self.data = data
+        self.exceptions_to_skip = exceptions_to_skip
+        self.breadcrumbs = breadcrumbs
+
+    def copy(self):
+        # nested dicts are never modified in place, see ``Context.merge``
+        return _ContextState(dict(self.data), set(self.exceptions_to_skip),
+                             self.breadcrumbs.copy())
+
+
+class Context(Mapping, Iterable):
     """
     Stores context until cleared.
 
+    The context is kept separately per thread and, on Python 3.7 and later,
+    per asyncio task or greenlet. A task starts out with the context of
+    the code that spawned it, and only gets a copy of its own once it
+    changes it.
+
     >>> def view_handler(view_func, *args, **kwargs):
     >>>     context = Context()
     >>>     context.merge(tags={'key': 'value'})
@@ -45,22 +69,31 @@ class Context(local, Mapping, Iterable):
     >>>         return view_func(*args, **kwargs)
     >>>     finally:
     >>>         context.clear()
+
+    Values other than ``tags`` and ``extra`` may also be callables, which
+    are only called once an event is built:
+
+    >>> context.merge({'request': lambda: get_http_info(request)})
     """
 
     def __init__(self, client=None):
-        breadcrumbs = raven.breadcrumbs.make_buffer(
-            client is None or client.enable_breadcrumbs)
+        self._enable_breadcrumbs = client is None or client.enable_breadcrumbs
         if client is not None:
             client = weakref(client)
         self._client = client
-        # Because the thread auto activates the thread local this also
-        # means that we auto activate this thing.  Only if someone decides
-        # to deactivate manually later another call to activate is
-        # technically necessary.
+        self._state = ContextLocal(self._new_state)
+        self._state.get()
+
+    def _new_state(self):
+        # Because every thread gets a fresh state this also means that we
+        # auto activate this thing.  Only if someone decides to deactivate
+        # manually later another call to activate is technically necessary.
         self.activate()
-        self.data = {}
-        self.exceptions_to_skip = set()
-        self.breadcrumbs = breadcrumbs
+        return _ContextState(
+            {}, set(), raven.breadcrumbs.make_buffer(self._enable_breadcrumbs))
+
+    def _get_writable_state(self):
+        return self._state.get_writable(_ContextState.copy)
 
     @property
     def client(self):
@@ -68,6 +101,37 @@ class Context(local, Mapping, Iterable):
             return None
         return self._client()
 
+    @property
+    def data(self):
+        return self._state.get().data
+
+    @data.setter
+    def data(self, value):
+        self._get_writable_state().data = value
+
+    @property
+    def exceptions_to_skip(self):
+        # may be shared with other tasks, see ``skip_exception``
+        return self._state.get().exceptions_to_skip
+
+    @property
+    def breadcrumbs(self):
+        # may be shared with other tasks, see ``record_breadcrumb``
+        return self._state.get().breadcrumbs
+
+    def skip_exception(self, key):
+        """
+        Adds ``key`` to the exceptions to skip of the running task.
+        """
+        self._get_writable_state().exceptions_to_skip.add(key)
+
+    def record_breadcrumb(self, *args, **kwargs):
+        """
+        Records a breadcrumb in the buffer of the running task, see
+        ``BreadcrumbBuffer.record``.
+        """
+        self._get_writable_state().breadcrumbs.record(*args, **kwargs)
+
     def __hash__(self):
         return id(self)
 
@@ -110,12 +174,15 @@ class Context(local, Mapping, Iterable):
     def merge(self, data, activate=True):
         if activate:
             self.activate()
-        d = self.data
+        d = self._get_writable_state().data
         for key, value in iteritems(data):
             if key in ('tags', 'extra'):
-                d.setdefault(key, {})
+                # copied rather than updated, as the dict may be shared
+                # with other tasks
+                merged = dict(d.get(key) or ())
                 for t_key, t_value in iteritems(value):
-                    d[key][t_key] = t_value
+                    merged[t_key] = t_value
+                d[key] = merged
             else:
                 d[key] = value
 
@@ -125,10 +192,37 @@ class Context(local, Mapping, Iterable):
     def get(self):
         return self.data
 
+    def resolve(self):
+        """
+        Returns the context data with all deferred values replaced by what
+        their callables return.
+
+        The results are kept so every callable is only called once. A value
+        whose callable fails is dropped.
+        """
+        data = self.data
+        deferred = [key for key, value in iteritems(data) if callable(value)]
+        if not deferred:
+            return data
+
+        d = self._get_writable_state().data
+        for key in deferred:
+            provider = d.get(key)
+            if not callable(provider):
+                continue
+            try:
+                d[key] = provider()
+            except Exception:
+                del d[key]
+                logger.exception('Unable to resolve context value %r', key)
+        return d
+
     def clear(self, deactivate=None):
-        self.data = {}
-        self.exceptions_to_skip.clear()
-        self.breadcrumbs.clear()
+        # other tasks may still share the current state, so it is replaced
+        # rather than cleared
+        self._state.get()
+        self._state.set(_ContextState(
+            {}, set(), raven.breadcrumbs.make_buffer(self._enable_breadcrumbs)))
 
         # If the caller did not specify if it wants to deactivate the
         # context for the thread we only deactivate it if we're not the
@@ -32,6 +32,12 @@ class PromiseSerializer(Serializer):
 
         return True
 
+    def can_type(self, cls):
+        # only promises need the (expensive) attribute probing in ``can``
+        if not issubclass(cls, Promise):
+            return False
+        return None
+
     def serialize(self, value, **kwargs):
         # EPIC HACK
         # handles lazy model instances (which are proxy values that don't
@@ -239,10 +239,10 @@ class Sentry(object):
         if request.url_rule:
             self.client.transaction.push(request.url_rule.rule)
 
-        try:
-            self.client.http_context(self.get_http_info(request))
-        except Exception as e:
-            self.client.logger.exception(to_unicode(e))
+        # the request proxy is no longer bound once the request has ended,
+        # so the actual request object is kept around
+        current_request = request._get_current_object()
+        self.client.http_context(lambda: self.get_http_info(current_request))
         try:
             self.client.user_context(self.get_user_info(request))
         except Exception as e:
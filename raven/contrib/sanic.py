@@ -15,6 +15,7 @@ import blinker
 from raven.conf import setup_logging
 from raven.base import Client
 from raven.handlers.logging import SentryHandler
+from raven.transport.asyncio import AsyncioHTTPTransport
 from raven.utils.compat import urlparse
 from raven.utils.encoding import to_unicode
 from raven.utils.conf import convert_options
@@ -37,6 +38,7 @@ def make_client(client_cls, app, dsn=None):
                 'extra': {
                     'app': app,
                 },
+                'transport': AsyncioHTTPTransport,
             },
         )
     )
@@ -183,10 +185,7 @@ class Sentry(object):
 
     def before_request(self, request):
         self.last_event_id = None
-        try:
-            self.client.http_context(self.get_http_info(request))
-        except Exception as e:
-            self.client.logger.exception(to_unicode(e))
+        self.client.http_context(lambda: self.get_http_info(request))
 
     def after_request(self, request, response):
         if self.last_event_id:
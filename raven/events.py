@@ -92,9 +92,10 @@ class Exception(BaseEvent):
         Convert exception info to a value for the values list.
         """
         stack_info = get_stack_info(
-            iter_traceback_frames(exc_traceback),
+            iter_traceback_frames(exc_traceback, collapse_recursion=True),
             transformer=self.transform,
             capture_locals=self.client.capture_locals,
+            in_app=self.client.is_in_app,
         )
 
         exc_module = getattr(exc_type, '__module__', None)
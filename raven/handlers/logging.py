@@ -104,8 +104,9 @@ class SentryHandler(logging.Handler, object):
             print(to_string(traceback.format_exc()), file=sys.stderr)
 
     def _get_targetted_stack(self, stack, record):
-        # we might need to traverse this multiple times, so coerce it to a list
-        stack = list(stack)
+        # skip everything up to the first frame after the logging module,
+        # keeping the skipped frames in case no such frame is found
+        skipped = []
         frames = []
         started = False
         last_mod = ''
@@ -124,15 +125,17 @@ class SentryHandler(logging.Handler, object):
                     and not module_name.startswith('logging')
                 ):
                     started = True
+                    skipped = None
                 else:
                     last_mod = module_name
+                    skipped.append((frame, lineno))
                     continue
 
             frames.append((frame, lineno))
 
         # We failed to find a starting point
         if not frames:
-            return stack
+            return skipped
 
         return frames
 
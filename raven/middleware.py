@@ -93,9 +93,8 @@ class Sentry(object):
         self.client = client
 
     def __call__(self, environ, start_response):
-        # TODO(dcramer): ideally this is lazy, but the context helpers must
-        # support callbacks first
-        self.client.http_context(self.get_http_context(environ))
+        # the context is only built if an event is actually captured
+        self.client.http_context(lambda: self.get_http_context(environ))
         with common_exception_handling(environ, self):
             iterable = self.application(environ, start_response)
         return ClosingIterator(self, iterable, environ)
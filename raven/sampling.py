@@ -0,0 +1,108 @@
+"""
+raven.sampling
+~~~~~~~~~~~~~~
+
+:copyright: (c) 2010-2012 by the Sentry Team, see AUTHORS for more details.
+:license: BSD, see LICENSE for more details.
+"""
+from __future__ import absolute_import
+
+import math
+import threading
+import time
+
+from raven.conf import defaults
+from raven.utils.compat import iteritems
+
+__all__ = ('AdaptiveSampler',)
+
+# the share of buckets evicted at once when the table is full
+EVICT_FRACTION = 0.1
+
+
+class _Rate(object):
+    """
+    An exponentially weighted count of events, which decays by a factor of
+    ``e`` every ``window`` seconds. For a steady stream of events it
+    converges to the number of events per second times ``window``.
+    """
+
+    __slots__ = ('count', 'updated')
+
+    def __init__(self):
+        self.count = 0.0
+        self.updated = None
+
+    def add(self, now, window):
+        if self.updated is None:
+            self.updated = now
+        elif now > self.updated:
+            self.count *= math.exp((self.updated - now) / window)
+            self.updated = now
+        self.count += 1
+        return self.count
+
+
+class AdaptiveSampler(object):
+    """
+    Adjusts the sample rate so that about ``rate`` events per second are
+    sent, however many are captured.
+
+    The rate at which events arrive is tracked as an exponentially weighted
+    moving average over ``window`` seconds, and every event is sampled with
+    the probability of ``rate`` over that average. Bursts of up to about
+    ``rate * window`` events are sent in full before sampling kicks in.
+
+    If ``bucket_rate`` is given, events are additionally limited to about
+    that many per second per bucket (e.g. per fingerprint), so that a single
+    storm does not use up the budget of all other events. At most
+    ``max_buckets`` buckets are tracked.
+    """
+
+    def __init__(self, rate, bucket_rate=None,
+                 window=defaults.SAMPLE_BUDGET_WINDOW,
+                 max_buckets=defaults.SAMPLE_BUDGET_MAX_BUCKETS):
+        if rate <= 0 or (bucket_rate is not None and bucket_rate <= 0):
+            raise ValueError('Sample budgets must be positive')
+
+        self.rate = rate
+        self.bucket_rate = bucket_rate
+        self.window = float(window)
+        self.max_buckets = max_buckets
+
+        self._lock = threading.Lock()
+        self._total = _Rate()
+        self._buckets = {}
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def get_rate(self, bucket=None, now=None):
+        """
+        Records an event in ``bucket`` and returns the probability with which
+        it should be sent.
+        """
+        if now is None:
+            now = time.time()
+
+        window = self.window
+        with self._lock:
+            sample_rate = self.rate * window / self._total.add(now, window)
+
+            if self.bucket_rate is not None and bucket is not None:
+                rate = self._buckets.get(bucket)
+                if rate is None:
+                    if len(self._buckets) >= self.max_buckets:
+                        self._evict()
+                    rate = self._buckets[bucket] = _Rate()
+                sample_rate = min(
+                    sample_rate,
+                    self.bucket_rate * window / rate.add(now, window))
+
+        return min(sample_rate, 1.0)
+
+    def _evict(self):
+        by_age = sorted(iteritems(self._buckets), key=lambda i: i[1].updated)
+        count = max(1, int(self.max_buckets * EVICT_FRACTION))
+        for bucket, _ in by_age[:count]:
+            del self._buckets[bucket]
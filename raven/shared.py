@@ -0,0 +1,383 @@
+"""
+raven.shared
+~~~~~~~~~~~~
+
+:copyright: (c) 2010-2012 by the Sentry Team, see AUTHORS for more details.
+:license: BSD, see LICENSE for more details.
+"""
+from __future__ import absolute_import
+
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+from contextlib import contextmanager
+
+from raven.aggregation import EventAggregator
+from raven.base import ClientState
+from raven.conf import defaults
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+
+__all__ = ('SharedState', 'SharedClientState', 'SharedEventAggregator')
+
+MAGIC = b'RVN1'
+
+# magic, number of slots, status, retry number, last check, retry after
+_header = struct.Struct('=4sIIIdd')
+HEADER_SIZE = 64
+
+# the bytes of a fingerprint kept to summarize it
+FINGERPRINT_SIZE = 200
+
+# key, last seen, window start, count, suppressed, fingerprint
+_slot = struct.Struct('=8sddII%ds' % FINGERPRINT_SIZE)
+_counters = struct.Struct('=ddII')
+_last_seen = struct.Struct('=d')
+
+EMPTY_KEY = b'\0' * 8
+
+# the number of slots searched for a fingerprint
+PROBE_LIMIT = 8
+
+
+def get_key(fingerprint):
+    key = hashlib.sha1(fingerprint.encode('utf-8')).digest()[:8]
+    return key if key != EMPTY_KEY else b'\0' * 7 + b'\1'
+
+
+# path -> thread lock shared by all tables of this process on that path.
+# Record locks are held by the process, so they do not keep its threads
+# from each other, and closing any descriptor of the file releases them.
+_path_locks = {}
+_path_locks_lock = threading.Lock()
+_path_locks_pid = os.getpid()
+
+
+def _get_path_lock(path):
+    global _path_locks_lock, _path_locks_pid
+    if _path_locks_pid != os.getpid():
+        # the locks may have been held by other threads when the process
+        # forked
+        _path_locks_lock = threading.Lock()
+        _path_locks.clear()
+        _path_locks_pid = os.getpid()
+    with _path_locks_lock:
+        lock = _path_locks.get(path)
+        if lock is None:
+            lock = _path_locks[path] = threading.Lock()
+        return lock
+
+
+class SharedState(object):
+    """
+    A fixed-size table in a memory mapped file at ``path``, which holds the
+    backoff state and event fingerprint counters of all processes on a
+    host which use the same file.
+
+    The table is created with room for ``slots`` fingerprints if it does
+    not exist yet. Updates are serialized with ``fcntl`` record locks, so
+    the file should be on a local file system, ideally a ``tmpfs`` such as
+    ``/dev/shm``.
+    """
+
+    def __init__(self, path, slots=defaults.SHARED_STATE_SLOTS):
+        if fcntl is None:
+            raise ImportError('SharedState requires fcntl.')
+
+        self.path = os.path.realpath(path)
+        self.slots = slots
+        self._fd = None
+        self._map = None
+        self._pid = os.getpid()
+        self._lock = _get_path_lock(self.path)
+        with self._lock:
+            self._open()
+
+    def _open(self):
+        while True:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.lockf(fd, fcntl.LOCK_EX)
+                # another process may have replaced the file while we were
+                # waiting for the lock
+                try:
+                    if os.fstat(fd).st_ino != os.stat(self.path).st_ino:
+                        continue
+                except OSError:
+                    continue
+                slots = self._read_slots(fd)
+                if slots is None:
+                    self._create()
+                    continue
+                # the table was created by another process, possibly with
+                # a different number of slots
+                self.slots = slots
+                self._map = mmap.mmap(fd, HEADER_SIZE + slots * _slot.size)
+                self._fd, fd = fd, None
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+                return
+            finally:
+                if fd is not None:
+                    os.close(fd)
+
+    def _read_slots(self, fd):
+        header = os.read(fd, _header.size)
+        if len(header) != _header.size or header[:4] != MAGIC:
+            return None
+        slots = _header.unpack(header)[1]
+        if os.fstat(fd).st_size < HEADER_SIZE + slots * _slot.size:
+            return None
+        return slots
+
+    def _create(self):
+        # the table is put in place in one go: a file other processes have
+        # mapped must not be truncated under them
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(self.path),
+            prefix=os.path.basename(self.path) + '.')
+        try:
+            os.ftruncate(fd, HEADER_SIZE + self.slots * _slot.size)
+            os.write(fd, _header.pack(
+                MAGIC, self.slots, ClientState.ONLINE, 0, 0, 0))
+        finally:
+            os.close(fd)
+        try:
+            os.rename(tmp_path, self.path)
+        except OSError:
+            os.unlink(tmp_path)
+            raise
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            self._lock = _get_path_lock(self.path)
+            self._pid = os.getpid()
+
+    @contextmanager
+    def lock(self):
+        """
+        Gives the running thread exclusive access to the table.
+        """
+        self._check_pid()
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+    def close(self):
+        self._check_pid()
+        # closing the descriptor releases the record locks other tables of
+        # this process hold on the file
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                os.close(self._fd)
+                self._map = self._fd = None
+
+    def get_backoff(self):
+        """
+        Returns ``(status, retry_number, last_check, retry_after)``.
+        """
+        return _header.unpack_from(self._map, 0)[2:]
+
+    def set_backoff(self, status, retry_number, last_check, retry_after):
+        _header.pack_into(
+            self._map, 0, MAGIC, self.slots, status, retry_number,
+            last_check, retry_after)
+
+    def find(self, key):
+        """
+        Returns the index of the slot holding ``key`` or, if there is none,
+        of a free slot or of the least recently seen one, and its contents.
+        """
+        data = self._map
+        start = struct.unpack_from('=Q', key)[0] % self.slots
+        found = oldest = None
+        for probe in range(min(PROBE_LIMIT, self.slots)):
+            index = (start + probe) % self.slots
+            offset = HEADER_SIZE + index * _slot.size
+            slot_key = data[offset:offset + 8]
+            if slot_key == key:
+                return index, self.get(index)
+            if found is None or oldest is not None:
+                if slot_key == EMPTY_KEY:
+                    found, oldest = index, None
+                else:
+                    last_seen = _last_seen.unpack_from(data, offset + 8)[0]
+                    if oldest is None or last_seen < oldest:
+                        found, oldest = index, last_seen
+        return found, self.get(found)
+
+    def get(self, index):
+        """
+        Returns the ``(key, last_seen, start, count, suppressed,
+        fingerprint)`` stored in slot ``index``.
+        """
+        slot = _slot.unpack_from(self._map, HEADER_SIZE + index * _slot.size)
+        return slot[:5] + (
+            slot[5].rstrip(b'\0').decode('utf-8', 'ignore'),)
+
+    def put(self, index, key, last_seen, start, count, suppressed,
+            fingerprint=None):
+        """
+        Stores a fingerprint in slot ``index``, or only updates its counters
+        if ``fingerprint`` is None.
+        """
+        offset = HEADER_SIZE + index * _slot.size
+        if fingerprint is None:
+            _counters.pack_into(
+                self._map, offset + 8, last_seen, start, count, suppressed)
+        else:
+            _slot.pack_into(
+                self._map, offset, key, last_seen, start, count, suppressed,
+                fingerprint.encode('utf-8')[:FINGERPRINT_SIZE])
+
+    def clear(self, index):
+        self.put(index, EMPTY_KEY, 0, 0, 0, 0, u'')
+
+
+class SharedClientState(ClientState):
+    """
+    A ``ClientState`` which is shared by all processes using ``shared``, so
+    that once one of them is told to back off all of them do.
+    """
+
+    def __init__(self, shared):
+        super(SharedClientState, self).__init__()
+        self.shared = shared
+
+    def _load(self):
+        (self.status, self.retry_number, last_check,
+         self.retry_after) = self.shared.get_backoff()
+        self.last_check = last_check or None
+
+    def _store(self):
+        self.shared.set_backoff(
+            self.status, self.retry_number, self.last_check or 0,
+            self.retry_after)
+
+    def should_try(self):
+        with self.shared.lock():
+            self._load()
+        return super(SharedClientState, self).should_try()
+
+    def set_fail(self, retry_after=0):
+        with self.shared.lock():
+            self._load()
+            super(SharedClientState, self).set_fail(retry_after)
+            self._store()
+
+    def set_success(self):
+        with self.shared.lock():
+            self._load()
+            if self.status == self.ONLINE:
+                return
+            super(SharedClientState, self).set_success()
+            self._store()
+
+    def did_fail(self):
+        with self.shared.lock():
+            self._load()
+        return super(SharedClientState, self).did_fail()
+
+
+class SharedEventAggregator(EventAggregator):
+    """
+    An ``EventAggregator`` which counts events in ``shared``, so that
+    duplicates are suppressed across all processes using it.
+
+    The number of fingerprints tracked is bounded by the size of the table.
+    The ``sent``, ``suppressed``, ``summaries`` and ``evicted`` counters
+    only cover the events recorded by this process.
+    """
+
+    def __init__(self, shared, window=defaults.AGGREGATE_WINDOW,
+                 limit=defaults.AGGREGATE_LIMIT):
+        super(SharedEventAggregator, self).__init__(
+            window=window, limit=limit, max_fingerprints=shared.slots)
+        self.shared = shared
+
+    def __len__(self):
+        with self.shared.lock():
+            return sum(
+                1 for index in range(self.shared.slots)
+                if self.shared.get(index)[0] != EMPTY_KEY)
+
+    def get_stats(self):
+        stats = super(SharedEventAggregator, self).get_stats()
+        stats['fingerprints'] = len(self)
+        return stats
+
+    def record(self, fingerprint, now=None):
+        if now is None:
+            now = time.time()
+
+        key = get_key(fingerprint)
+        summaries = []
+        shared = self.shared
+        with shared.lock():
+            index, slot = shared.find(key)
+            if slot[0] == key and now - slot[2] >= self.window:
+                self._summarize(slot[5], slot[1:5], now, summaries)
+                slot = None
+            elif slot[0] != key:
+                if slot[0] != EMPTY_KEY:
+                    self._summarize(slot[5], slot[1:5], now, summaries)
+                    self.evicted += 1
+                slot = None
+
+            if slot is None:
+                start, count, suppressed = now, 0, 0
+            else:
+                start, count, suppressed = slot[2:5]
+                # the fingerprint is already stored
+                fingerprint = None
+
+            count += 1
+            send = count <= self.limit
+            if send:
+                self.sent += 1
+            else:
+                suppressed += 1
+                self.suppressed += 1
+            shared.put(index, key, now, start, count, suppressed, fingerprint)
+
+            if now >= self._next_sweep:
+                self._sweep(now, summaries)
+                self._next_sweep = now + self.window
+
+        return send, summaries
+
+    def flush(self, now=None):
+        """
+        Forgets all fingerprints and returns the summaries of the events
+        suppressed so far by any process.
+        """
+        if now is None:
+            now = time.time()
+
+        summaries = []
+        with self.shared.lock():
+            self._sweep(now, summaries, expired_only=False)
+        return summaries
+
+    def _sweep(self, now, summaries, expired_only=True):
+        shared = self.shared
+        for index in range(shared.slots):
+            slot = shared.get(index)
+            if slot[0] == EMPTY_KEY:
+                continue
+            if expired_only and now - slot[2] < self.window:
+                continue
+            shared.clear(index)
+            self._summarize(slot[5], slot[1:5], now, summaries)
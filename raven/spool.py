@@ -0,0 +1,337 @@
+"""
+raven.spool
+~~~~~~~~~~~
+
+:copyright: (c) 2010-2012 by the Sentry Team, see AUTHORS for more details.
+:license: BSD, see LICENSE for more details.
+"""
+from __future__ import absolute_import
+
+import errno
+import logging
+import os
+import struct
+import threading
+import time
+
+from raven.conf import defaults
+
+__all__ = ('EventSpool',)
+
+logger = logging.getLogger('sentry.errors')
+
+FSYNC_NEVER = 'never'
+FSYNC_SEGMENT = 'segment'
+FSYNC_ALWAYS = 'always'
+FSYNC_POLICIES = (FSYNC_NEVER, FSYNC_SEGMENT, FSYNC_ALWAYS)
+
+DEFAULT_SEGMENT_SIZE = 1024 * 1024
+
+# records are buffered in memory and written out in chunks of this size
+WRITE_BUFFER_SIZE = 64 * 1024
+
+SEGMENT_SUFFIX = '.spool'
+ACTIVE_SUFFIX = '.active'
+REPLAY_SUFFIX = '.replay'
+
+# payload length, timestamp in milliseconds
+_record_header = struct.Struct('>IQ')
+
+
+def _pid_is_running(pid):
+    if os.name == 'nt':
+        # os.kill() terminates the process on Windows
+        return True
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return True
+
+
+class EventSpool(object):
+    """
+    An append-only, segment based on-disk spool of encoded events.
+
+    Payloads are appended to an active segment file through an in-memory
+    buffer, so spooling an event rarely touches the disk in the calling
+    thread. Once the active segment grows past ``segment_size`` it is
+    closed and becomes eligible for replay. The oldest segments are
+    evicted when the spool exceeds ``max_bytes``, and records older than
+    ``max_age`` seconds are skipped when replaying.
+
+    ``fsync`` controls durability: ``never`` leaves flushing to the OS,
+    ``segment`` syncs every closed segment and ``always`` syncs every
+    record.
+
+    Several processes may share a directory; each writes its own segments
+    and a segment is claimed through an atomic rename before it is replayed.
+    A claimed segment is only removed once all of its records were sent, so
+    a process dying while replaying leaves it to be replayed again.
+    """
+
+    def __init__(self, path, max_bytes=defaults.SPOOL_MAX_BYTES,
+                 max_age=defaults.SPOOL_MAX_AGE,
+                 segment_size=DEFAULT_SEGMENT_SIZE, fsync=defaults.SPOOL_FSYNC):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError('Unknown spool fsync policy: %r' % (fsync,))
+
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.segment_size = segment_size
+        self.fsync = fsync
+
+        self._lock = threading.Lock()
+        self._replay_lock = threading.Lock()
+        self._fd = None
+        self._active_path = None
+        self._active_size = 0
+        self._buffer = bytearray()
+        self._pid = os.getpid()
+        self._seq = 0
+
+        try:
+            os.makedirs(path)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+        self._recover()
+        self._bytes = self._segments_size()
+
+    def _recover(self):
+        # segments being written or replayed by processes that have died
+        # are put back so they can be replayed
+        for name in os.listdir(self.path):
+            if name.endswith(ACTIVE_SUFFIX):
+                # <timestamp>-<seq>-<pid>.active
+                base = name[:-len(ACTIVE_SUFFIX)]
+                pid = base.rsplit('-', 1)[-1]
+            elif name.endswith(REPLAY_SUFFIX):
+                # <segment>.<pid of the replaying process>.replay
+                base, _, pid = name[:-len(REPLAY_SUFFIX)].rpartition('.')
+            else:
+                continue
+            try:
+                pid = int(pid)
+            except ValueError:
+                continue
+            if pid == self._pid or not _pid_is_running(pid):
+                try:
+                    os.rename(os.path.join(self.path, name),
+                              os.path.join(self.path, base + SEGMENT_SUFFIX))
+                except OSError:
+                    pass
+
+    def _segments(self):
+        return sorted(
+            os.path.join(self.path, name)
+            for name in os.listdir(self.path)
+            if name.endswith(SEGMENT_SUFFIX)
+        )
+
+    def _segments_size(self):
+        size = 0
+        for segment in self._segments():
+            try:
+                size += os.path.getsize(segment)
+            except OSError:
+                pass
+        return size
+
+    def _new_segment_name(self):
+        self._seq += 1
+        return '%019d-%06d-%d' % (
+            int(time.time() * 1000000), self._seq, self._pid)
+
+    def _open(self):
+        self._active_path = os.path.join(
+            self.path, self._new_segment_name() + ACTIVE_SUFFIX)
+        self._fd = os.open(
+            self._active_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        self._active_size = 0
+
+    def _flush(self, sync=False):
+        if self._fd is None:
+            return
+        if self._buffer:
+            data = bytes(self._buffer)
+            del self._buffer[:]
+            os.write(self._fd, data)
+        if sync:
+            os.fsync(self._fd)
+
+    def _rotate(self):
+        """
+        Closes the active segment so that it can be replayed.
+        """
+        if self._fd is None:
+            return
+        self._flush(sync=self.fsync != FSYNC_NEVER)
+        os.close(self._fd)
+        self._fd = None
+        os.rename(
+            self._active_path,
+            self._active_path[:-len(ACTIVE_SUFFIX)] + SEGMENT_SUFFIX)
+        self._bytes += self._active_size
+        self._active_path = None
+        self._active_size = 0
+
+    def _evict(self):
+        for segment in self._segments():
+            if self._bytes + self._active_size <= self.max_bytes:
+                break
+            try:
+                size = os.path.getsize(segment)
+                os.remove(segment)
+            except OSError:
+                continue
+            self._bytes -= size
+            logger.warning('Sentry spool is full, dropped %d bytes of events',
+                           size)
+
+    def _check_pid(self):
+        if self._pid == os.getpid():
+            return
+        # the active segment and its buffer belong to the parent process
+        self._fd = None
+        self._active_path = None
+        self._active_size = 0
+        self._buffer = bytearray()
+        self._pid = os.getpid()
+
+    def append(self, payload, timestamp=None):
+        """
+        Adds an encoded event to the spool.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        record = _record_header.pack(len(payload), int(timestamp * 1000))
+
+        try:
+            with self._lock:
+                self._check_pid()
+                if self._fd is None:
+                    self._open()
+
+                self._buffer += record
+                self._buffer += payload
+                self._active_size += len(record) + len(payload)
+
+                if self.fsync == FSYNC_ALWAYS:
+                    self._flush(sync=True)
+                elif len(self._buffer) >= WRITE_BUFFER_SIZE:
+                    self._flush()
+
+                if self._active_size >= self.segment_size:
+                    self._rotate()
+
+                if self._bytes + self._active_size > self.max_bytes:
+                    self._evict()
+        except (IOError, OSError):
+            logger.error('Unable to spool event to %s', self.path,
+                         exc_info=True)
+            return False
+        return True
+
+    def has_pending(self):
+        return self._bytes > 0 or self._active_size > 0
+
+    def close(self):
+        try:
+            with self._lock:
+                self._check_pid()
+                self._rotate()
+        except (IOError, OSError):
+            logger.error('Unable to close spool segment in %s', self.path,
+                         exc_info=True)
+
+    def _read(self, path):
+        with open(path, 'rb') as fp:
+            data = fp.read()
+
+        records = []
+        offset = 0
+        header_size = _record_header.size
+        while offset + header_size <= len(data):
+            length, timestamp = _record_header.unpack_from(data, offset)
+            offset += header_size
+            payload = data[offset:offset + length]
+            if len(payload) < length:
+                # truncated by a crash while writing
+                break
+            offset += length
+            records.append((timestamp / 1000.0, payload))
+        return records
+
+    def _write_segment(self, path, records):
+        """
+        Writes ``records`` to a new segment at ``path``, replacing whatever
+        is there.
+        """
+        data = bytearray()
+        for timestamp, payload in records:
+            data += _record_header.pack(len(payload), int(timestamp * 1000))
+            data += payload
+        tmp_path = path + '.tmp'
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            os.write(fd, bytes(data))
+            if self.fsync != FSYNC_NEVER:
+                os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.rename(tmp_path, path)
+        return len(data)
+
+    def replay(self, send):
+        """
+        Calls ``send(payload)`` for every spooled payload, oldest first.
+        ``send`` must only return once the payload was delivered.
+
+        Replay stops as soon as ``send`` returns False, and the payloads
+        which were not sent stay spooled.
+        """
+        if not self._replay_lock.acquire(False):
+            # another thread is already replaying
+            return
+
+        try:
+            with self._lock:
+                self._check_pid()
+                self._rotate()
+
+            cutoff = time.time() - self.max_age
+            for segment in self._segments():
+                claimed = '%s.%d%s' % (
+                    segment[:-len(SEGMENT_SUFFIX)], self._pid, REPLAY_SUFFIX)
+                try:
+                    size = os.path.getsize(segment)
+                    os.rename(segment, claimed)
+                except OSError:
+                    # claimed by another process
+                    continue
+
+                records = [
+                    record for record in self._read(claimed)
+                    if record[0] >= cutoff
+                ]
+                for idx, (timestamp, payload) in enumerate(records):
+                    if not send(payload):
+                        # the rest is put back in place of the segment, so
+                        # it is still replayed first
+                        rest = self._write_segment(segment, records[idx:])
+                        os.remove(claimed)
+                        with self._lock:
+                            self._bytes = max(self._bytes - size + rest, 0)
+                        return
+
+                os.remove(claimed)
+                with self._lock:
+                    self._bytes = max(self._bytes - size, 0)
+        except (IOError, OSError):
+            logger.error('Unable to replay spooled events from %s', self.path,
+                         exc_info=True)
+        finally:
+            self._replay_lock.release()
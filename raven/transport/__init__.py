@@ -9,6 +9,8 @@ raven.transport
 # manually import/register transports somehow
 from __future__ import absolute_import
 
+import sys
+
 from raven.transport.base import *  # NOQA
 from raven.transport.eventlet import *  # NOQA
 from raven.transport.exceptions import *  # NOQA
@@ -19,3 +21,6 @@ from raven.transport.registry import *  # NOQA
 from raven.transport.twisted import *  # NOQA
 from raven.transport.threaded import *  # NOQA
 from raven.transport.tornado import *  # NOQA
+
+if sys.version_info >= (3, 5):
+    from raven.transport.asyncio import *  # NOQA
@@ -0,0 +1,313 @@
+"""
+raven.transport.asyncio
+~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2010-2018 by the Sentry Team, see AUTHORS for more details.
+:license: BSD, see LICENSE for more details.
+"""
+from __future__ import absolute_import
+
+import asyncio
+import functools
+import logging
+import ssl
+import threading
+import time
+
+from http.client import parse_headers
+from io import BytesIO
+
+from raven.transport.base import AsyncTransport
+from raven.transport.http import HTTPTransport
+from raven.utils.compat import HTTPError, string_types
+from raven.utils.urlparse import urlparse
+
+__all__ = ('AsyncioHTTPTransport',)
+
+DEFAULT_MAX_CONCURRENCY = 10
+
+DEFAULT_QUEUE_SIZE = 100
+
+logger = logging.getLogger('sentry.errors')
+
+
+def _get_running_loop():
+    try:
+        return asyncio.get_running_loop()
+    except AttributeError:
+        # Python < 3.7
+        loop = asyncio.get_event_loop()
+        return loop if loop.is_running() else None
+    except RuntimeError:
+        return None
+
+
+class AsyncioHTTPTransport(AsyncTransport, HTTPTransport):
+    """
+    Sends events over pooled ``asyncio`` streams without blocking the event
+    loop or spawning threads.
+
+    At most ``max_concurrency`` requests are in flight at any time, and up
+    to ``pool_connections`` idle keep-alive connections are kept per host.
+    Events are dropped while ``queue_size`` events, or ``queue_max_bytes``
+    of payloads, are already waiting to be sent.
+
+    Events captured outside of the event loop's thread are handed to the
+    loop the transport last sent from. Without one they are sent
+    synchronously.
+    """
+
+    scheme = ['asyncio+http', 'asyncio+https']
+
+    def __init__(self, *args, **kwargs):
+        # keyword only, so that positional arguments keep meaning what they
+        # mean for HTTPTransport
+        max_concurrency = kwargs.pop(
+            'max_concurrency', DEFAULT_MAX_CONCURRENCY)
+        queue_size = kwargs.pop('queue_size', DEFAULT_QUEUE_SIZE)
+        queue_max_bytes = kwargs.pop('queue_max_bytes', 0)
+
+        if isinstance(max_concurrency, string_types):
+            max_concurrency = int(max_concurrency)
+        if isinstance(queue_size, string_types):
+            queue_size = int(queue_size)
+        if isinstance(queue_max_bytes, string_types):
+            queue_max_bytes = int(queue_max_bytes)
+        if max_concurrency < 1:
+            raise ValueError(
+                'AsyncioHTTPTransport needs a max_concurrency of at least 1')
+
+        super(AsyncioHTTPTransport, self).__init__(*args, **kwargs)
+        self.max_concurrency = max_concurrency
+        self.queue_size = queue_size
+        self.queue_max_bytes = queue_max_bytes
+        self._loop = None
+        self._semaphore = None
+        self._idle = {}
+        self._tasks = set()
+        # events accepted but not sent yet, which may be captured in any
+        # thread
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._pending_bytes = 0
+        self._warned_sync = False
+        self.enqueued_events = 0
+        self.dropped_events = 0
+
+    def _bind(self, loop):
+        if self._loop is not loop:
+            # connections and semaphores cannot be shared between loops
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._idle = {}
+            self._tasks = set()
+            with self._lock:
+                self._pending = 0
+                self._pending_bytes = 0
+
+    def _reserve(self, size):
+        with self._lock:
+            if ((self.queue_size and self._pending >= self.queue_size)
+                    or (self.queue_max_bytes
+                        and self._pending_bytes + size
+                        > self.queue_max_bytes)):
+                self.dropped_events += 1
+                return False
+            self._pending += 1
+            self._pending_bytes += size
+            self.enqueued_events += 1
+        return True
+
+    def _release(self, size, task):
+        # tasks of a loop the transport moved away from were forgotten
+        if task not in self._tasks:
+            return
+        self._tasks.discard(task)
+        with self._lock:
+            self._pending -= 1
+            self._pending_bytes -= size
+
+    def _start(self, url, data, headers, success_cb, failure_cb):
+        task = self._loop.create_task(
+            self._send(url, data, headers, success_cb, failure_cb))
+        self._tasks.add(task)
+        task.add_done_callback(functools.partial(self._release, len(data)))
+
+    def async_send(self, url, data, headers, success_cb, failure_cb):
+        loop = _get_running_loop()
+        if loop is not None:
+            self._bind(loop)
+            if self._reserve(len(data)):
+                self._start(url, data, headers, success_cb, failure_cb)
+            return
+
+        loop = self._loop
+        if loop is not None and loop.is_running():
+            # captured in another thread, such as an executor
+            if not self._reserve(len(data)):
+                return
+            try:
+                loop.call_soon_threadsafe(
+                    self._start, url, data, headers, success_cb, failure_cb)
+                return
+            except RuntimeError:
+                # the loop was closed in the meantime
+                with self._lock:
+                    self._pending -= 1
+                    self._pending_bytes -= len(data)
+
+        if not self._warned_sync:
+            self._warned_sync = True
+            logger.warning(
+                'No asyncio event loop is running, sending events '
+                'synchronously')
+        try:
+            self.send(url, data, headers)
+        except Exception as e:
+            failure_cb(e)
+        else:
+            success_cb()
+
+    async def flush(self, timeout=None):
+        """
+        Waits until all pending events have been sent. Returns False if
+        ``timeout`` expired first.
+        """
+        if not self._tasks:
+            return True
+        _, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        return not pending
+
+    def close(self):
+        """
+        Closes all idle keep-alive connections.
+        """
+        idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for _, writer, _ in connections:
+                writer.close()
+
+    async def _send(self, url, data, headers, success_cb, failure_cb):
+        async with self._semaphore:
+            try:
+                await asyncio.wait_for(
+                    self._post(url, data, headers), self.timeout)
+            except Exception as e:
+                failure_cb(e)
+            else:
+                success_cb()
+
+    def _ssl_context(self):
+        if self.verify_ssl:
+            return ssl.create_default_context(cafile=self.ca_certs)
+        return ssl._create_unverified_context()
+
+    async def _get_conn(self, key):
+        idle = self._idle.get(key)
+        now = time.time()
+        while idle:
+            reader, writer, last_used = idle.pop()
+            if (now - last_used > self.pool_idle_timeout
+                    or reader.at_eof() or writer.transport.is_closing()):
+                writer.close()
+                continue
+            return reader, writer, True
+
+        scheme, host, port = key
+        reader, writer = await asyncio.open_connection(
+            host, port, ssl=self._ssl_context() if scheme == 'https' else None)
+        return reader, writer, False
+
+    def _put_conn(self, key, reader, writer):
+        idle = self._idle.setdefault(key, [])
+        if len(idle) < self.pool_connections:
+            idle.append((reader, writer, time.time()))
+        else:
+            writer.close()
+
+    async def _post(self, url, data, headers):
+        parsed = urlparse(url)
+        port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        key = (parsed.scheme, parsed.hostname, port)
+
+        path = parsed.path or '/'
+        if parsed.query:
+            path = '%s?%s' % (path, parsed.query)
+
+        host = parsed.hostname
+        if parsed.port:
+            host = '%s:%d' % (host, parsed.port)
+        lines = ['POST %s HTTP/1.1' % path, 'Host: %s' % host,
+                 'Content-Length: %d' % len(data)]
+        for name, value in (headers or {}).items():
+            lines.append('%s: %s' % (name, value))
+        request = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + data
+
+        reader, writer, reused = await self._get_conn(key)
+        try:
+            status, reason, response_headers, keep_alive = \
+                await self._request(reader, writer, request)
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            writer.close()
+            if not reused:
+                raise
+            # the server dropped a keep-alive connection; retry once on a
+            # fresh connection
+            reader, writer, _ = await self._get_conn(key)
+            try:
+                status, reason, response_headers, keep_alive = \
+                    await self._request(reader, writer, request)
+            except BaseException:
+                writer.close()
+                raise
+        except BaseException:
+            writer.close()
+            raise
+
+        if keep_alive:
+            self._put_conn(key, reader, writer)
+        else:
+            writer.close()
+
+        if not 200 <= status < 300:
+            self.raise_api_error(status, response_headers)
+            raise HTTPError(url, status, reason, response_headers, None)
+
+    async def _request(self, reader, writer, request):
+        writer.write(request)
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise asyncio.IncompleteReadError(status_line, None)
+        version, status, reason = (
+            status_line.decode('latin-1').rstrip('\r\n').split(' ', 2) + [''])[:3]
+        status = int(status)
+
+        header_lines = []
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            header_lines.append(line)
+        response_headers = parse_headers(
+            BytesIO(b''.join(header_lines) + b'\r\n'))
+
+        keep_alive = (
+            version == 'HTTP/1.1'
+            and response_headers.get('connection', '').lower() != 'close')
+
+        # the body has to be consumed before the connection can be reused
+        if response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                size = int((await reader.readline()).split(b';', 1)[0], 16)
+                await reader.readexactly(size + 2)
+                if not size:
+                    break
+        elif response_headers.get('content-length') is not None:
+            await reader.readexactly(int(response_headers['content-length']))
+        else:
+            await reader.read()
+            keep_alive = False
+
+        return status, reason, response_headers, keep_alive
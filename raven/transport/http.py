@@ -7,52 +7,96 @@ raven.transport.http
 """
 from __future__ import absolute_import
 
+import threading
+
 from raven.utils.compat import string_types, urllib2
 from raven.conf import defaults
 from raven.exceptions import APIError, RateLimited
 from raven.transport.base import Transport
-from raven.utils.http import urlopen
+from raven.utils.http import HTTPConnectionPool, urlopen
+from raven.utils.urlparse import urlparse
 
 
 class HTTPTransport(Transport):
     scheme = ['sync+http', 'sync+https']
 
     def __init__(self, timeout=defaults.TIMEOUT, verify_ssl=True,
-                 ca_certs=defaults.CA_BUNDLE):
+                 ca_certs=defaults.CA_BUNDLE, keepalive=False,
+                 pool_connections=defaults.POOL_CONNECTIONS,
+                 pool_idle_timeout=defaults.POOL_IDLE_TIMEOUT):
         if isinstance(timeout, string_types):
             timeout = int(timeout)
         if isinstance(verify_ssl, string_types):
             verify_ssl = bool(int(verify_ssl))
+        if isinstance(keepalive, string_types):
+            keepalive = bool(int(keepalive))
+        if isinstance(pool_connections, string_types):
+            pool_connections = int(pool_connections)
+        if isinstance(pool_idle_timeout, string_types):
+            pool_idle_timeout = float(pool_idle_timeout)
 
         self.timeout = timeout
         self.verify_ssl = verify_ssl
         self.ca_certs = ca_certs
+        self.keepalive = keepalive
+        self.pool_connections = pool_connections
+        self.pool_idle_timeout = pool_idle_timeout
+        self._pools = {}
+        self._pools_lock = threading.Lock()
+
+    def get_pool(self, url):
+        """
+        Returns the keep-alive connection pool for the host of ``url``.
+        """
+        parsed = urlparse(url)
+        key = (parsed.scheme, parsed.hostname, parsed.port)
+        with self._pools_lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = self._pools[key] = HTTPConnectionPool(
+                    scheme=parsed.scheme,
+                    host=parsed.hostname,
+                    port=parsed.port,
+                    maxsize=self.pool_connections,
+                    idle_timeout=self.pool_idle_timeout,
+                    timeout=self.timeout,
+                    verify_ssl=self.verify_ssl,
+                    ca_certs=self.ca_certs,
+                )
+        return pool
 
     def send(self, url, data, headers):
         """
         Sends a request to a remote webserver using HTTP POST.
         """
-        req = urllib2.Request(url, headers=headers)
-
         try:
-            response = urlopen(
-                url=req,
-                data=data,
-                timeout=self.timeout,
-                verify_ssl=self.verify_ssl,
-                ca_certs=self.ca_certs,
-            )
-        except urllib2.HTTPError as exc:
-            msg = exc.headers.get('x-sentry-error')
-            code = exc.getcode()
-            if code == 429:
-                try:
-                    retry_after = int(exc.headers.get('retry-after'))
-                except (ValueError, TypeError):
-                    retry_after = 0
-                raise RateLimited(msg, retry_after)
-            elif msg:
-                raise APIError(msg, code)
+            if self.keepalive:
+                response = self.get_pool(url).urlopen(
+                    'POST', url, body=data, headers=headers)
             else:
-                raise
+                response = urlopen(
+                    url=urllib2.Request(url, headers=headers),
+                    data=data,
+                    timeout=self.timeout,
+                    verify_ssl=self.verify_ssl,
+                    ca_certs=self.ca_certs,
+                )
+        except urllib2.HTTPError as exc:
+            self.raise_api_error(exc.getcode(), exc.headers)
+            raise
         return response
+
+    def raise_api_error(self, code, headers):
+        """
+        Raises ``RateLimited`` or ``APIError`` for an error response from
+        Sentry, if it can be interpreted as one.
+        """
+        msg = headers.get('x-sentry-error')
+        if code == 429:
+            try:
+                retry_after = int(headers.get('retry-after'))
+            except (ValueError, TypeError):
+                retry_after = 0
+            raise RateLimited(msg, retry_after)
+        elif msg:
+            raise APIError(msg, code)
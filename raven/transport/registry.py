@@ -7,6 +7,8 @@ raven.transport.registry
 """
 from __future__ import absolute_import
 
+import sys
+
 # TODO(dcramer): we really should need to import all of these by default
 from raven.transport.eventlet import EventletHTTPTransport
 from raven.transport.exceptions import DuplicateScheme
@@ -73,3 +75,7 @@ default_transports = [
     TornadoHTTPTransport,
     EventletHTTPTransport,
 ]
+
+if sys.version_info >= (3, 5):
+    from raven.transport.asyncio import AsyncioHTTPTransport
+    default_transports.append(AsyncioHTTPTransport)
@@ -16,31 +16,78 @@ from time import sleep, time
 
 from raven.transport.base import AsyncTransport
 from raven.transport.http import HTTPTransport
-from raven.utils.compat import Queue, check_threads
+from raven.utils.compat import Queue, binary_type, check_threads, string_types
 
 DEFAULT_TIMEOUT = 10
 
+DEFAULT_BLOCK_TIMEOUT = 1
+
+OVERFLOW_DROP_NEWEST = 'drop_newest'
+OVERFLOW_DROP_OLDEST = 'drop_oldest'
+OVERFLOW_BLOCK = 'block'
+OVERFLOW_POLICIES = (OVERFLOW_DROP_NEWEST, OVERFLOW_DROP_OLDEST, OVERFLOW_BLOCK)
+
 logger = logging.getLogger('sentry.errors')
 
 
+class _SizedQueue(Queue):
+    """
+    A queue that keeps track of the total payload size of its records.
+    """
+
+    def _init(self, maxsize):
+        Queue._init(self, maxsize)
+        self.bytes = 0
+
+    def _put(self, item):
+        self.queue.append(item)
+        self.bytes += _record_size(item)
+
+    def _get(self):
+        item = self.queue.popleft()
+        self.bytes -= _record_size(item)
+        return item
+
+
+def _record_size(record):
+    if isinstance(record, tuple):
+        return record[3]
+    return 0
+
+
 class AsyncWorker(object):
     _terminator = object()
 
-    def __init__(self, shutdown_timeout=DEFAULT_TIMEOUT):
+    def __init__(self, shutdown_timeout=DEFAULT_TIMEOUT, maxsize=0,
+                 max_bytes=0, overflow=OVERFLOW_DROP_NEWEST,
+                 block_timeout=DEFAULT_BLOCK_TIMEOUT, threads=1):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError('Unknown queue overflow policy: %r' % (overflow,))
+        if threads < 1:
+            raise ValueError('AsyncWorker needs at least one thread')
+
         check_threads()
-        self._queue = Queue(-1)
+        self._queue = _SizedQueue(-1)
         self._lock = threading.Lock()
-        self._thread = None
+        self._threads = []
         self._thread_for_pid = None
         self.options = {
             'shutdown_timeout': shutdown_timeout,
+            'threads': threads,
+            'maxsize': maxsize,
+            'max_bytes': max_bytes,
+            'overflow': overflow,
+            'block_timeout': block_timeout,
         }
+        self.enqueued_events = 0
+        self.dropped_events = 0
         self.start()
 
     def is_alive(self):
         if self._thread_for_pid != os.getpid():
             return False
-        return self._thread and self._thread.is_alive()
+        return bool(self._threads) and all(
+            t.is_alive() for t in self._threads)
 
     def _ensure_thread(self):
         if self.is_alive():
@@ -53,8 +100,9 @@ class AsyncWorker(object):
                 # thread not started or already stopped - nothing to do
                 return
 
-            # wake the processing thread up
-            self._queue.put_nowait(self._terminator)
+            # wake the processing threads up
+            for _ in self._threads:
+                self._queue.put_nowait(self._terminator)
 
             timeout = self.options['shutdown_timeout']
 
@@ -78,7 +126,7 @@ class AsyncWorker(object):
 
                 self._timed_queue_join(timeout - initial_timeout)
 
-            self._thread = None
+            self._threads = []
 
     def _timed_queue_join(self, timeout):
         """
@@ -106,14 +154,22 @@ class AsyncWorker(object):
 
     def start(self):
         """
-        Starts the task thread.
+        Starts the task threads.
         """
         self._lock.acquire()
         try:
             if not self.is_alive():
-                self._thread = threading.Thread(target=self._target, name="raven.AsyncWorker")
-                self._thread.setDaemon(True)
-                self._thread.start()
+                if self._thread_for_pid == os.getpid():
+                    threads = [t for t in self._threads if t.is_alive()]
+                else:
+                    # threads are not inherited through fork()
+                    threads = []
+                while len(threads) < self.options['threads']:
+                    thread = threading.Thread(target=self._target, name="raven.AsyncWorker")
+                    thread.setDaemon(True)
+                    thread.start()
+                    threads.append(thread)
+                self._threads = threads
                 self._thread_for_pid = os.getpid()
         finally:
             self._lock.release()
@@ -121,18 +177,89 @@ class AsyncWorker(object):
 
     def stop(self, timeout=None):
         """
-        Stops the task thread. Synchronous!
+        Stops the task threads. Synchronous!
         """
         with self._lock:
-            if self._thread:
-                self._queue.put_nowait(self._terminator)
-                self._thread.join(timeout=timeout)
-                self._thread = None
+            if self._threads:
+                for _ in self._threads:
+                    self._queue.put_nowait(self._terminator)
+                deadline = None if timeout is None else time() + timeout
+                for thread in self._threads:
+                    if deadline is None:
+                        thread.join()
+                    else:
+                        thread.join(timeout=max(deadline - time(), 0))
+                self._threads = []
                 self._thread_for_pid = None
 
     def queue(self, callback, *args, **kwargs):
+        """
+        Queues ``callback`` to be called on one of the worker threads.
+
+        The size of a record is the total length of its byte string
+        arguments (i.e. the encoded payload). If the queue is full the
+        configured overflow policy applies; returns False when the record
+        was dropped.
+        """
         self._ensure_thread()
-        self._queue.put_nowait((callback, args, kwargs))
+        size = sum(len(a) for a in args if isinstance(a, binary_type))
+        return self._put((callback, args, kwargs, size))
+
+    def _is_full(self, size):
+        maxsize = self.options['maxsize']
+        max_bytes = self.options['max_bytes']
+        queue = self._queue
+        if maxsize and queue._qsize() >= maxsize:
+            return True
+        if max_bytes and queue.bytes + size > max_bytes:
+            return True
+        return False
+
+    def _drop_oldest(self):
+        queue = self._queue
+        for record in queue.queue:
+            if record is not self._terminator:
+                break
+        else:
+            return False
+
+        queue.queue.remove(record)
+        queue.bytes -= _record_size(record)
+        queue.unfinished_tasks -= 1
+        if not queue.unfinished_tasks:
+            queue.all_tasks_done.notify_all()
+        self.dropped_events += 1
+        return True
+
+    def _put(self, record):
+        queue = self._queue
+        size = _record_size(record)
+        overflow = self.options['overflow']
+
+        with queue.not_full:
+            if self._is_full(size):
+                if overflow == OVERFLOW_DROP_OLDEST:
+                    while self._is_full(size) and self._drop_oldest():
+                        pass
+                elif overflow == OVERFLOW_BLOCK:
+                    max_bytes = self.options['max_bytes']
+                    if not max_bytes or size <= max_bytes:
+                        deadline = time() + self.options['block_timeout']
+                        while self._is_full(size):
+                            delay = deadline - time()
+                            if delay <= 0:
+                                break
+                            queue.not_full.wait(delay)
+
+                if self._is_full(size):
+                    self.dropped_events += 1
+                    return False
+
+            queue._put(record)
+            queue.unfinished_tasks += 1
+            queue.not_empty.notify()
+            self.enqueued_events += 1
+        return True
 
     def _target(self):
         while True:
@@ -140,7 +267,7 @@ class AsyncWorker(object):
             try:
                 if record is self._terminator:
                     break
-                callback, args, kwargs = record
+                callback, args, kwargs, _ = record
                 try:
                     callback(*args, **kwargs)
                 except Exception:
@@ -155,9 +282,47 @@ class ThreadedHTTPTransport(AsyncTransport, HTTPTransport):
 
     scheme = ['http', 'https', 'threaded+http', 'threaded+https']
 
+    def __init__(self, *args, **kwargs):
+        # keyword only, so that positional arguments keep meaning what they
+        # mean for HTTPTransport
+        queue_size = kwargs.pop('queue_size', 0)
+        queue_max_bytes = kwargs.pop('queue_max_bytes', 0)
+        queue_overflow = kwargs.pop('queue_overflow', OVERFLOW_DROP_NEWEST)
+        queue_block_timeout = kwargs.pop(
+            'queue_block_timeout', DEFAULT_BLOCK_TIMEOUT)
+        worker_threads = kwargs.pop('worker_threads', 1)
+
+        if isinstance(worker_threads, string_types):
+            worker_threads = int(worker_threads)
+        if isinstance(queue_size, string_types):
+            queue_size = int(queue_size)
+        if isinstance(queue_max_bytes, string_types):
+            queue_max_bytes = int(queue_max_bytes)
+        if isinstance(queue_block_timeout, string_types):
+            queue_block_timeout = float(queue_block_timeout)
+        # the worker is only created on the first send, which is too late
+        # to find out about a broken DSN
+        if queue_overflow not in OVERFLOW_POLICIES:
+            raise ValueError(
+                'Unknown queue overflow policy: %r' % (queue_overflow,))
+        if worker_threads < 1:
+            raise ValueError('AsyncWorker needs at least one thread')
+
+        self.worker_options = {
+            'maxsize': queue_size,
+            'max_bytes': queue_max_bytes,
+            'overflow': queue_overflow,
+            'block_timeout': queue_block_timeout,
+            'threads': worker_threads,
+        }
+        super(ThreadedHTTPTransport, self).__init__(*args, **kwargs)
+        # every sender thread needs its own keep-alive connection
+        self.pool_connections = max(self.pool_connections, worker_threads)
+
     def get_worker(self):
         if not hasattr(self, '_worker') or not self._worker.is_alive():
-            self._worker = AsyncWorker()
+            self._worker = AsyncWorker(
+                **getattr(self, 'worker_options', {}))
         return self._worker
 
     def send_sync(self, url, data, headers, success_cb, failure_cb):
@@ -8,7 +8,9 @@ raven.utils
 from __future__ import absolute_import
 
 import logging
+import re
 import sys
+import threading
 
 # Using "NOQA" to preserve export compatibility
 from raven.utils.compat import iteritems, string_types  # NOQA
@@ -24,25 +26,114 @@ logger = logging.getLogger('raven.errors')
 # continuous imports and lookups of modules
 _VERSION_CACHE = {}
 
+# Installed distributions, built once, see ``get_distribution_index``
+_DISTRIBUTION_INDEX = None
+_distribution_lock = threading.Lock()
+
+_dist_name_re = re.compile(r'[-_.]+')
+
+
+def _normalize_dist_name(name):
+    return _dist_name_re.sub('-', name).lower()
+
+
+def _get_dist_name(dist):
+    # derived from the metadata directory name where possible, as parsing
+    # the metadata itself is comparatively slow
+    name = getattr(dist, '_normalized_name', None) or dist.metadata['Name']
+    if name:
+        return _normalize_dist_name(name)
+
+
+def get_distribution_index():
+    """
+    Returns a ``(distributions, packages)`` tuple of dicts which map the
+    normalized names of all installed distributions, and the top level
+    packages they declare, to their ``importlib.metadata`` distribution.
+
+    The index is built the first time it is needed. None is returned if
+    neither ``importlib.metadata`` nor the ``importlib_metadata`` backport
+    is available.
+    """
+    global _DISTRIBUTION_INDEX
+
+    if _DISTRIBUTION_INDEX is not None:
+        return _DISTRIBUTION_INDEX or None
+
+    with _distribution_lock:
+        if _DISTRIBUTION_INDEX is not None:
+            return _DISTRIBUTION_INDEX or None
+
+        try:
+            from importlib import metadata
+        except ImportError:
+            try:
+                import importlib_metadata as metadata
+            except ImportError:
+                metadata = None
+
+        if metadata is None:
+            _DISTRIBUTION_INDEX = ()
+            return None
+
+        distributions = {}
+        packages = {}
+        for dist in metadata.distributions():
+            try:
+                name = _get_dist_name(dist)
+                # the first distribution found on sys.path wins, as it is
+                # the one that gets imported
+                if not name or name in distributions:
+                    continue
+                distributions[name] = dist
+                for package in (dist.read_text('top_level.txt') or '').split():
+                    if packages.setdefault(package, dist) is not dist:
+                        # namespace packages are shared by several
+                        # distributions, none of which has their version
+                        packages[package] = None
+            except Exception as e:
+                logger.exception(e)
+
+        _DISTRIBUTION_INDEX = (distributions, packages)
+        return _DISTRIBUTION_INDEX
+
+
+def _get_distribution_version(index, module_name):
+    distributions, packages = index
+    dist = (distributions.get(_normalize_dist_name(module_name))
+            or packages.get(module_name))
+    if dist is None:
+        return None
+    try:
+        return dist.version or None
+    except Exception:
+        return None
+
 
 def get_version_from_app(module_name, app):
     version = None
 
-    # Try to pull version from pkg_resources first
+    # Try to pull version from the distribution metadata first
     # as it is able to detect version tagged with egg_info -b
-    try:
-        # Importing pkg_resources can be slow, so only import it
-        # if we need it.
-        import pkg_resources
-    except ImportError:
-        # pkg_resource is not available on Google App Engine
-        pass
+    index = get_distribution_index()
+    if index is not None:
+        dist_version = _get_distribution_version(index, module_name)
+        if dist_version:
+            return dist_version
     else:
-        # pull version from pkg_resources if distro exists
         try:
-            return pkg_resources.get_distribution(module_name).version
-        except Exception:
+            # Importing pkg_resources can be slow, so only import it
+            # if we need it.
+            import pkg_resources
+        except ImportError:
+            # pkg_resource is not available on Google App Engine
             pass
+        else:
+            # pull version from pkg_resources if distro exists
+            try:
+                return pkg_resources.get_distribution(module_name).version
+            except Exception:
+                pass
 
     if hasattr(app, 'get_version'):
         version = app.get_version
@@ -68,7 +159,16 @@ def get_version_from_app(module_name, app):
     return str(version)
 
 
-def get_versions(module_list=None):
+def get_versions(module_list=None, block=True, import_modules=True):
+    """
+    Returns the versions of the given modules and their parent packages.
+
+    Versions are taken from the distribution metadata where possible, and
+    otherwise from the module itself, which has to be imported for that.
+    With ``import_modules=False`` the modules without metadata are skipped,
+    and with ``block=False`` only versions which have been looked up before
+    are returned.
+    """
     if not module_list:
         return {}
 
@@ -78,24 +178,36 @@ def get_versions(module_list=None):
         ext_module_list.update('.'.join(parts[:idx])
                                for idx in range(1, len(parts) + 1))
 
+    index = None
     versions = {}
     for module_name in ext_module_list:
         if module_name not in _VERSION_CACHE:
-            try:
-                __import__(module_name)
-            except ImportError:
+            if not block:
                 continue
 
-            try:
-                app = sys.modules[module_name]
-            except KeyError:
-                continue
-
-            try:
-                version = get_version_from_app(module_name, app)
-            except Exception as e:
-                logger.exception(e)
-                version = None
+            if index is None:
+                index = get_distribution_index() or ({}, {})
+            version = _get_distribution_version(index, module_name)
+
+            if version is None:
+                if not import_modules:
+                    continue
+
+                try:
+                    __import__(module_name)
+                except ImportError:
+                    continue
+
+                try:
+                    app = sys.modules[module_name]
+                except KeyError:
+                    continue
+
+                try:
+                    version = get_version_from_app(module_name, app)
+                except Exception as e:
+                    logger.exception(e)
+                    version = None
 
             _VERSION_CACHE[module_name] = version
         else:
@@ -9,7 +9,8 @@ except ImportError:
 from functools import update_wrapper
 import threading
 
-from raven.utils.compat import iteritems
+from raven.utils.compat import (
+    binary_type, integer_types, iteritems, text_type)
 
 
 def merge_dicts(*dicts):
@@ -23,28 +24,109 @@ def merge_dicts(*dicts):
     return out
 
 
+class _VarmapFrame(object):
+    __slots__ = ('var', 'name', 'items', 'is_sequence', 'out', 'changed',
+                 'waiting', 'key', 'value')
+
+    def __init__(self, var, name, items, is_sequence, changed):
+        self.var = var
+        self.name = name
+        self.items = items
+        self.is_sequence = is_sequence
+        self.out = []
+        self.changed = changed
+        # whether a child is currently being mapped, and which
+        self.waiting = False
+        self.key = None
+        self.value = None
+
+    def add(self, key, value, result):
+        if result is not value:
+            self.changed = True
+        if self.is_sequence:
+            self.out.append(result)
+        else:
+            self.out.append((key, result))
+
+    def result(self):
+        if not self.changed:
+            return self.var
+        if self.is_sequence:
+            return self.out
+        return dict(self.out)
+
+
+_pending = object()
+
+
+# values of these exact types have no children to map
+_leaf_types = frozenset(
+    (text_type, binary_type, float, bool, type(None)) + integer_types)
+
+
+def _varmap_enter(func, var, name, context, stack):
+    if type(var) in _leaf_types:
+        return func(name, var)
+
+    objid = id(var)
+    if objid in context:
+        return func(name, '<...>')
+
+    if isinstance(var, (list, tuple)) and not is_namedtuple(var):
+        context[objid] = 1
+        stack.append(_VarmapFrame(
+            var, name, iter(var), True,
+            changed=type(var) is not list))
+        return _pending
+
+    ret = func(name, var)
+    if isinstance(ret, Mapping):
+        context[objid] = 1
+        stack.append(_VarmapFrame(
+            var, name, iteritems(var), False,
+            changed=ret is not var or type(var) is not dict))
+        return _pending
+    return ret
+
+
 def varmap(func, var, context=None, name=None):
     """
     Executes ``func(key_name, value)`` on all values
     recurisively discovering dict and list scoped
     values.
+
+    Lists and dicts in which nothing was changed are returned as they are
+    rather than copied. Tuples are still returned as lists.
     """
     if context is None:
         context = {}
-    objid = id(var)
-    if objid in context:
-        return func(name, '<...>')
-    context[objid] = 1
 
-    if isinstance(var, (list, tuple)) and not is_namedtuple(var):
-        ret = [varmap(func, f, context, name) for f in var]
-    else:
-        ret = func(name, var)
-        if isinstance(ret, Mapping):
-            ret = dict((k, varmap(func, v, context, k))
-                       for k, v in iteritems(var))
-    del context[objid]
-    return ret
+    stack = []
+    result = _varmap_enter(func, var, name, context, stack)
+    while stack:
+        frame = stack[-1]
+        if frame.waiting:
+            # the child has just been mapped
+            frame.add(frame.key, frame.value, result)
+            frame.waiting = False
+
+        for item in frame.items:
+            if frame.is_sequence:
+                key, value = frame.name, item
+            else:
+                key, value = item
+            result = _varmap_enter(func, value, key, context, stack)
+            if result is _pending:
+                frame.waiting = True
+                frame.key = key
+                frame.value = value
+                break
+            frame.add(key, value, result)
+        else:
+            stack.pop()
+            del context[id(frame.var)]
+            result = frame.result()
+    return result
 
 
 class memoize(object):
@@ -0,0 +1,126 @@
+"""
+raven.utils.contextlocal
+~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2010-2012 by the Sentry Team, see AUTHORS for more details.
+:license: BSD, see LICENSE for more details.
+"""
+from __future__ import absolute_import
+
+import sys
+import weakref
+from threading import local
+
+try:
+    from contextvars import ContextVar
+except ImportError:
+    # Python < 3.7
+    ContextVar = None
+
+__all__ = ('ContextLocal',)
+
+# id of an asyncio task or greenlet -> (weak reference to it, the token
+# identifying it). Ids alone cannot be used: the memory of a finished task
+# is reused by the ones spawned later, so entries are dropped as soon as
+# their task is freed. Looking up ids is cheaper than a WeakKeyDictionary,
+# which creates a weak reference for every lookup.
+_tokens = {}
+_thread_tokens = local()
+
+
+def _get_token(key):
+    entry = _tokens.get(id(key))
+    if entry is not None and entry[0]() is key:
+        return entry[1]
+
+    key_id = id(key)
+
+    def forget(ref):
+        entry = _tokens.get(key_id)
+        if entry is not None and entry[0] is ref:
+            _tokens.pop(key_id, None)
+
+    token = object()
+    _tokens[key_id] = (weakref.ref(key, forget), token)
+    return token
+
+
+def get_owner():
+    """
+    Returns a token identifying what is currently running: the asyncio
+    task or greenlet, or otherwise the thread. A token is never reused.
+    """
+    asyncio = sys.modules.get('asyncio')
+    # _get_running_loop() returns None instead of raising outside of a loop,
+    # which is the common case and much cheaper
+    if asyncio is not None and hasattr(asyncio, '_get_running_loop'):
+        loop = asyncio._get_running_loop()
+        if loop is not None:
+            task = asyncio.current_task(loop)
+            if task is not None:
+                return _get_token(task)
+
+    greenlet = sys.modules.get('greenlet')
+    if greenlet is not None:
+        return _get_token(greenlet.getcurrent())
+
+    token = getattr(_thread_tokens, 'token', None)
+    if token is None:
+        token = _thread_tokens.token = object()
+    return token
+
+
+class ContextLocal(object):
+    """
+    Holds a separate value per thread and, where ``contextvars`` are
+    available, per asyncio task or greenlet.
+
+    Tasks start out sharing the value of the context they were spawned
+    from. Code that modifies the value in place has to go through
+    ``get_writable``, which hands the running task a copy of its own the
+    first time it writes.
+
+    ``factory`` creates the initial value wherever there is none yet.
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        if ContextVar is not None:
+            self._var = ContextVar('raven.%x' % id(self))
+        else:
+            self._var = None
+            self._local = local()
+
+    def _load(self):
+        if self._var is not None:
+            return self._var.get(None)
+        return getattr(self._local, 'value', None)
+
+    def get(self):
+        """
+        Returns the current value, which must not be modified in place.
+        """
+        rv = self._load()
+        if rv is None:
+            return self.set(self.factory())
+        return rv[1]
+
+    def get_writable(self, copy):
+        """
+        Returns the current value, replacing it with ``copy(value)`` first
+        if it is shared with the task it was inherited from.
+        """
+        rv = self._load()
+        if rv is None:
+            return self.set(self.factory())
+        owner, value = rv
+        if self._var is not None and owner is not get_owner():
+            value = self.set(copy(value))
+        return value
+
+    def set(self, value):
+        if self._var is not None:
+            self._var.set((get_owner(), value))
+        else:
+            self._local.value = (None, value)
+        return value
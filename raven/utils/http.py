@@ -7,13 +7,18 @@ raven.utils.http
 """
 from __future__ import absolute_import
 
+import os
+import select
 import socket
 import ssl
 import sys
+import threading
+import time
 
 from raven.conf import defaults
-from raven.utils.compat import urllib2, httplib
+from raven.utils.compat import BytesIO, HTTPError, urllib2, httplib
 from raven.utils.ssl_match_hostname import match_hostname
+from raven.utils.urlparse import urlparse
 
 
 def urlopen(url, data=None, timeout=defaults.TIMEOUT, ca_certs=None,
@@ -64,3 +69,144 @@ def urlopen(url, data=None, timeout=defaults.TIMEOUT, ca_certs=None,
         finally:
             socket.setdefaulttimeout(default_timeout)
     return opener.open(url, data, timeout)
+
+
+def _is_connection_dropped(conn):
+    """
+    Returns True if an idle connection has been closed by the peer.
+
+    An idle HTTP/1.1 connection should never be readable; if it is, the
+    server either closed it or sent something we cannot use.
+    """
+    sock = getattr(conn, 'sock', None)
+    if sock is None:
+        return True
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+    except (socket.error, ValueError):
+        return True
+    return bool(readable)
+
+
+class HTTPConnectionPool(object):
+    """
+    Keeps up to ``maxsize`` persistent HTTP/1.1 connections to a single
+    host so that consecutive requests can skip the TCP and TLS handshakes.
+
+    Idle connections are discarded once they have been unused for more than
+    ``idle_timeout`` seconds or when the peer has closed them. A request on
+    a reused connection that fails because the connection was reset is
+    retried once on a fresh connection.
+    """
+
+    def __init__(self, scheme, host, port=None, maxsize=1, idle_timeout=60,
+                 timeout=defaults.TIMEOUT, verify_ssl=True, ca_certs=None):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.verify_ssl = verify_ssl
+        self.ca_certs = ca_certs
+
+        self._lock = threading.Lock()
+        self._pool = []
+        self._pid = os.getpid()
+
+    def _new_conn(self):
+        if self.scheme != 'https':
+            return httplib.HTTPConnection(
+                self.host, self.port, timeout=self.timeout)
+
+        if self.verify_ssl:
+            context = ssl.create_default_context(cafile=self.ca_certs)
+        else:
+            context = ssl._create_unverified_context()
+        return httplib.HTTPSConnection(
+            self.host, self.port, timeout=self.timeout, context=context)
+
+    def _get_conn(self):
+        """
+        Returns a ``(connection, reused)`` tuple.
+        """
+        now = time.time()
+        with self._lock:
+            if self._pid != os.getpid():
+                # sockets inherited through fork() are shared with the
+                # parent process and must not be used by the child
+                self._pool = []
+                self._pid = os.getpid()
+
+            while self._pool:
+                conn, last_used = self._pool.pop()
+                if (now - last_used > self.idle_timeout
+                        or _is_connection_dropped(conn)):
+                    conn.close()
+                    continue
+                return conn, True
+
+        return self._new_conn(), False
+
+    def _put_conn(self, conn):
+        with self._lock:
+            if self._pid == os.getpid() and len(self._pool) < self.maxsize:
+                self._pool.append((conn, time.time()))
+                return
+        conn.close()
+
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, []
+        for conn, _ in pool:
+            conn.close()
+
+    def urlopen(self, method, url, body=None, headers=None):
+        """
+        Performs a request and returns the response with its body already
+        read, raising ``HTTPError`` for non-2xx responses.
+        """
+        conn, reused = self._get_conn()
+        try:
+            response, content = self._make_request(
+                conn, method, url, body, headers)
+        except socket.timeout:
+            conn.close()
+            raise
+        except (socket.error, httplib.HTTPException):
+            conn.close()
+            if not reused:
+                raise
+            # the server dropped a keep-alive connection between our health
+            # check and the request; try again on a fresh connection
+            conn = self._new_conn()
+            try:
+                response, content = self._make_request(
+                    conn, method, url, body, headers)
+            except Exception:
+                conn.close()
+                raise
+        except Exception:
+            conn.close()
+            raise
+
+        if response.will_close:
+            conn.close()
+        else:
+            self._put_conn(conn)
+
+        if not 200 <= response.status < 300:
+            raise HTTPError(url, response.status, response.reason,
+                            response.msg, BytesIO(content))
+        return response
+
+    def _make_request(self, conn, method, url, body, headers):
+        parsed = urlparse(url)
+        path = parsed.path or '/'
+        if parsed.query:
+            path = '%s?%s' % (path, parsed.query)
+        conn.request(method, path, body, headers or {})
+        response = conn.getresponse()
+        # the body has to be consumed before the connection can be reused
+        content = response.read()
+        return response, content
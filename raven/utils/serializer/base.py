@@ -29,6 +29,16 @@ def has_sentry_metadata(value):
         return False
 
 
+BUILTIN_TYPES = frozenset(
+    (text_type, binary_type, bool, float, int, tuple, list, dict, set,
+     frozenset, type(None)) + ((long,) if PY2 else ())  # noqa
+)
+
+
+def _get_func(method):
+    return getattr(method, '__func__', method)
+
+
 class Serializer(object):
     types = ()
 
@@ -42,6 +52,19 @@ class Serializer(object):
         """
         return isinstance(value, self.types)
 
+    def can_type(self, cls):
+        """
+        Given a type ``cls``, return a boolean describing whether this
+        serializer can operate on all values of that type, or None if it
+        depends on the value, in which case ``can`` is called.
+
+        Serializers overriding ``can`` should override this as well, or
+        ``can`` will be called for every value.
+        """
+        if _get_func(type(self).can) is not _base_can:
+            return None
+        return issubclass(cls, self.types)
+
     def serialize(self, value, **kwargs):
         """
         Given ``value``, coerce into a JSON-safe type.
@@ -68,6 +91,9 @@ class Serializer(object):
                                       _depth=_depth, **kwargs)
 
 
+_base_can = _get_func(Serializer.can)
+
+
 class NamedtupleSerializer(Serializer):
     types = (collections.namedtuple,)
 
@@ -78,6 +104,14 @@ class NamedtupleSerializer(Serializer):
         """
         return is_namedtuple(value)
 
+    def can_type(self, cls):
+        if not issubclass(cls, tuple):
+            return False
+        f = getattr(cls, '_fields', None)
+        if not isinstance(f, tuple):
+            return False
+        return all(type(n) is str for n in f)
+
     def serialize(self, value, **kwargs):
         list_max_length = kwargs.get('list_max_length') or float('inf')
         less_than = lambda x: x[0] < list_max_length
@@ -159,6 +193,13 @@ class TypeSerializer(Serializer):
         return not super(TypeSerializer, self).can(value) \
             and has_sentry_metadata(value)
 
+    def can_type(self, cls):
+        # classes are never handled, and instances of builtin types cannot
+        # carry a ``__sentry__`` attribute
+        if issubclass(cls, class_types) or cls in BUILTIN_TYPES:
+            return False
+        return None
+
     def serialize(self, value, **kwargs):
         return self.recurse(value.__sentry__(), **kwargs)
 
@@ -8,6 +8,7 @@ raven.utils.serializer.manager
 from __future__ import absolute_import
 
 import logging
+import threading
 from contextlib import closing
 from raven.utils.compat import text_type
 
@@ -22,6 +23,9 @@ class SerializationManager(object):
     def __init__(self):
         self.__registry = []
         self.__serializers = {}
+        # maps a type to the serializers that may handle its values, see
+        # ``Serializer.get_candidates``
+        self.dispatch = {}
 
     @property
     def serializers(self):
@@ -32,6 +36,8 @@ class SerializationManager(object):
     def register(self, serializer):
         if serializer not in self.__registry:
             self.__registry.append(serializer)
+            # the dispatch table depends on the registry and its order
+            self.dispatch = {}
         return serializer
 
 
@@ -41,14 +47,40 @@ class Serializer(object):
     def __init__(self, manager):
         self.manager = manager
         self.context = set()
+        self.in_use = False
+        self.dispatch = manager.dispatch
         self.serializers = []
         for serializer in manager.serializers:
             self.serializers.append(serializer(self))
+        self.all_candidates = tuple(
+            (idx, True) for idx in range(len(self.serializers)))
 
     def close(self):
         del self.serializers
         del self.context
 
+    def get_candidates(self, cls):
+        """
+        Returns the serializers that may handle values of type ``cls`` as
+        ``(index, check)`` pairs, in order. ``check`` is True if the
+        serializer's ``can`` has to be asked about the actual value.
+        """
+        try:
+            return self.dispatch[cls]
+        except KeyError:
+            pass
+
+        candidates = []
+        for idx, serializer in enumerate(self.serializers):
+            result = serializer.can_type(cls)
+            if result is None:
+                candidates.append((idx, True))
+            elif result:
+                candidates.append((idx, False))
+                break
+        candidates = self.dispatch[cls] = tuple(candidates)
+        return candidates
+
     def transform(self, value, **kwargs):
         """
         Primary function which handles recursively transforming
@@ -62,10 +94,23 @@ class Serializer(object):
             return '<...>'
         self.context.add(objid)
 
+        cls = type(value)
+        try:
+            # objects lying about their class (e.g. lazy proxies) need
+            # every serializer to look at them
+            cacheable = value.__class__ is cls
+        except Exception:
+            cacheable = False
+        if cacheable:
+            candidates = self.get_candidates(cls)
+        else:
+            candidates = self.all_candidates
+
         try:
-            for serializer in self.serializers:
+            for idx, check in candidates:
+                serializer = self.serializers[idx]
                 try:
-                    if serializer.can(value):
+                    if not check or serializer.can(value):
                         return serializer.serialize(value, **kwargs)
                 except Exception as e:
                     logger.exception(e)
@@ -89,6 +134,33 @@ manager = SerializationManager()
 register = manager.register
 
 
+_local = threading.local()
+
+
+def _get_serializer(manager):
+    # Building a Serializer instantiates every registered serializer, so
+    # each thread keeps one per manager around for top-level calls.
+    serializers = getattr(_local, 'serializers', None)
+    if serializers is None:
+        serializers = _local.serializers = {}
+
+    serializer = serializers.get(manager)
+    if serializer is None or serializer.dispatch is not manager.dispatch:
+        # new serializers were registered since this one was built
+        serializer = serializers[manager] = Serializer(manager)
+    return serializer
+
+
 def transform(value, manager=manager, **kwargs):
-    with closing(Serializer(manager)) as serializer:
+    serializer = _get_serializer(manager)
+    if serializer.in_use:
+        # a serializer is calling transform() itself; don't share the
+        # cycle detection context with the outer call
+        with closing(Serializer(manager)) as serializer:
+            return serializer.transform(value, **kwargs)
+
+    serializer.in_use = True
+    try:
         return serializer.transform(value, **kwargs)
+    finally:
+        serializer.in_use = False
@@ -7,11 +7,11 @@ raven.utils.stacks
 """
 from __future__ import absolute_import, division
 
-import inspect
 import linecache
 import re
 import os
 import sys
+import threading
 
 from raven.utils.serializer import transform
 from raven.utils.compat import iteritems
@@ -20,12 +20,92 @@ from raven.utils.compat import iteritems
 _coding_re = re.compile(r'coding[:=]\s*([-\w.]+)')
 
 
-def get_lines_from_file(filename, lineno, context_lines,
-                        loader=None, module_name=None):
+# rough per-line overhead of a cached ``str`` on top of its characters
+_LINE_OVERHEAD = 50
+
+
+class SourceCache(object):
     """
-    Returns context_lines before and after lineno from file.
-    Returns (pre_context_lineno, pre_context, context_line, post_context).
+    A bounded LRU cache of source files that have already been split into
+    lines, shared by all threads.
+
+    Entries are keyed by ``(filename, mtime, size)`` so that a file which
+    changes on disk is read again. The least recently used files are
+    evicted once the cached lines exceed ``max_bytes``.
     """
+
+    def __init__(self, max_bytes=8 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._bytes = 0
+        self._tick = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'files': len(self._entries),
+            'bytes': self._bytes,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+            self._bytes = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._tick += 1
+            entry[0] = self._tick
+            return entry[1]
+
+    def set(self, key, lines):
+        size = sum(len(line) + _LINE_OVERHEAD for line in lines)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._tick += 1
+            old = self._entries.get(key)
+            if old is not None:
+                self._bytes -= old[2]
+            self._entries[key] = [self._tick, lines, size]
+            self._bytes += size
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        by_age = sorted(iteritems(self._entries), key=lambda i: i[1][0])
+        for key, (_, _, size) in by_age:
+            if self._bytes <= self.max_bytes:
+                break
+            del self._entries[key]
+            self._bytes -= size
+
+
+source_cache = SourceCache()
+
+
+def _get_file_key(filename):
+    try:
+        st = os.stat(filename)
+    except (OSError, IOError, TypeError, ValueError):
+        # e.g. modules loaded from zip files
+        return (filename, None, None)
+    return (filename, st.st_mtime, st.st_size)
+
+
+def _load_source(filename, loader=None, module_name=None):
     source = None
     if loader is not None and hasattr(loader, "get_source"):
         try:
@@ -47,13 +127,32 @@ def get_lines_from_file(filename, lineno, context_lines,
             # ImportError: Loader for module cProfile cannot handle module __main__
             source = None
         if source is not None:
-            source = source.splitlines()
+            return source.splitlines()
+
+    try:
+        source = linecache.getlines(filename)
+    except (OSError, IOError):
+        return None
+    return [line.strip('\r\n') for line in source]
+
 
+def get_lines_from_file(filename, lineno, context_lines,
+                        loader=None, module_name=None):
+    """
+    Returns context_lines before and after lineno from file.
+    Returns (pre_context_lineno, pre_context, context_line, post_context).
+
+    Source lines are kept in ``source_cache`` so that repeated frames from
+    the same file do not read and split it again.
+    """
+    key = _get_file_key(filename)
+    if loader is not None:
+        key += (module_name,)
+    source = source_cache.get(key)
     if source is None:
-        try:
-            source = linecache.getlines(filename)
-        except (OSError, IOError):
-            return None, None, None
+        source = _load_source(filename, loader, module_name)
+        if source:
+            source_cache.set(key, source)
 
     if not source:
         return None, None, None
@@ -62,15 +161,9 @@ def get_lines_from_file(filename, lineno, context_lines,
     upper_bound = min(lineno + 1 + context_lines, len(source))
 
     try:
-        pre_context = [
-            line.strip('\r\n')
-            for line in source[lower_bound:lineno]
-        ]
-        context_line = source[lineno].strip('\r\n')
-        post_context = [
-            line.strip('\r\n')
-            for line in source[(lineno + 1):upper_bound]
-        ]
+        pre_context = source[lower_bound:lineno]
+        context_line = source[lineno]
+        post_context = source[(lineno + 1):upper_bound]
     except IndexError:
         # the file may have changed since it was loaded into memory
         return None, None, None
@@ -108,12 +201,50 @@ def to_dict(dictish):
     return dict((k, dictish[k]) for k in m())
 
 
-def iter_traceback_frames(tb):
+def _find_repeated_run(keys, max_period=16, min_repeats=10):
+    """
+    Given a list of ``(code, lineno)`` keys, returns ``(start, period,
+    repeats)`` for the longest run of a block of ``period`` keys that is
+    repeated back to back at least ``min_repeats`` times, or None.
+    """
+    keys_len = len(keys)
+    best = None
+    best_len = 0
+    idx = 0
+    while idx < keys_len:
+        found = None
+        for period in range(1, max_period + 1):
+            if idx + period * min_repeats > keys_len:
+                break
+            end = idx
+            while end + period < keys_len and keys[end] == keys[end + period]:
+                end += 1
+            repeats = (end - idx) // period + 1
+            if repeats >= min_repeats and (
+                    found is None or repeats * period > found[1] * found[2]):
+                found = (idx, period, repeats)
+        if found is None:
+            idx += 1
+            continue
+        if found[1] * found[2] > best_len:
+            best = found
+            best_len = found[1] * found[2]
+        idx += found[1] * found[2]
+    return best
+
+
+def iter_traceback_frames(tb, collapse_recursion=False):
     """
     Given a traceback object, it will iterate over all
     frames that do not contain the ``__traceback_hide__``
     local variable.
+
+    With ``collapse_recursion`` the longest run of frames repeated by a
+    recursive call is collapsed into a single copy of the repeated block,
+    and ``(frame, lineno, repeats)`` is yielded instead, where ``repeats``
+    is how many times the block occurred (1 for every other frame).
     """
+    frames = []
     # Some versions of celery have hacked traceback objects that might
     # miss tb_frame.
     while tb and hasattr(tb, 'tb_frame'):
@@ -121,9 +252,40 @@ def iter_traceback_frames(tb):
         # to hide internal frames.
         f_locals = getattr(tb.tb_frame, 'f_locals', {})
         if not _getitem_from_frame(f_locals, '__traceback_hide__'):
-            yield tb.tb_frame, getattr(tb, 'tb_lineno', None)
+            if not collapse_recursion:
+                yield tb.tb_frame, getattr(tb, 'tb_lineno', None)
+            else:
+                frames.append((tb.tb_frame, getattr(tb, 'tb_lineno', None)))
         tb = tb.tb_next
 
+    if not collapse_recursion:
+        return
+
+    run = _find_repeated_run([
+        (getattr(frame, 'f_code', None), lineno) for frame, lineno in frames
+    ])
+    if run is None:
+        for frame, lineno in frames:
+            yield frame, lineno, 1
+        return
+
+    start, period, repeats = run
+    for frame, lineno in frames[:start]:
+        yield frame, lineno, 1
+    for frame, lineno in frames[start:start + period]:
+        yield frame, lineno, repeats
+    for frame, lineno in frames[start + period * repeats:]:
+        yield frame, lineno, 1
+
+
+def walk_stack(frame):
+    """
+    Given a frame, iterates over it and all of its callers, innermost first.
+    """
+    while frame is not None:
+        yield frame
+        frame = frame.f_back
+
 
 def iter_stack_frames(frames=None):
     """
@@ -132,9 +294,14 @@ def iter_stack_frames(frames=None):
     local variable.
     """
     if not frames:
-        frames = inspect.stack()[1:]
+        # unlike inspect.stack() this does not look up file names and
+        # source lines for every frame on the stack
+        stack = [(f, f.f_lineno) for f in walk_stack(sys._getframe(1))]
+        stack.reverse()
+    else:
+        stack = ((f[0], f[2]) for f in reversed(frames))
 
-    for frame, lineno in ((f[0], f[2]) for f in reversed(frames)):
+    for frame, lineno in stack:
         f_locals = getattr(frame, 'f_locals', {})
         if not _getitem_from_frame(f_locals, '__traceback_hide__'):
             yield frame, lineno
@@ -164,53 +331,65 @@ def get_frame_locals(frame, transformer=transform, max_var_size=4096):
     return f_vars
 
 
-def slim_frame_data(frames, frame_allowance=25):
+def _get_slimmed_indexes(in_app, frame_allowance=25):
     """
-    Removes various excess metadata from middle frames which go beyond
-    ``frame_allowance``.
-
-    Returns ``frames``.
+    Given a list of ``in_app`` flags, one per frame, returns the set of
+    frame indexes whose locals and surrounding context should be dropped to
+    stay within ``frame_allowance``.
     """
-    frames_len = 0
+    frames_len = len(in_app)
+    if frames_len <= frame_allowance:
+        return set()
+
     app_frames = []
     system_frames = []
-    for frame in frames:
-        frames_len += 1
-        if frame.get('in_app'):
-            app_frames.append(frame)
+    for idx, is_app in enumerate(in_app):
+        if is_app:
+            app_frames.append(idx)
         else:
-            system_frames.append(frame)
-
-    if frames_len <= frame_allowance:
-        return frames
+            system_frames.append(idx)
 
+    slimmed = set()
     remaining = frames_len - frame_allowance
     app_count = len(app_frames)
     system_allowance = max(frame_allowance - app_count, 0)
     if system_allowance:
         half_max = int(system_allowance / 2)
         # prioritize trimming system frames
-        for frame in system_frames[half_max:-half_max]:
-            frame.pop('vars', None)
-            frame.pop('pre_context', None)
-            frame.pop('post_context', None)
+        for idx in system_frames[half_max:-half_max]:
+            slimmed.add(idx)
             remaining -= 1
 
     else:
-        for frame in system_frames:
-            frame.pop('vars', None)
-            frame.pop('pre_context', None)
-            frame.pop('post_context', None)
+        for idx in system_frames:
+            slimmed.add(idx)
             remaining -= 1
 
     if remaining:
         app_allowance = app_count - remaining
         half_max = int(app_allowance / 2)
 
-        for frame in app_frames[half_max:-half_max]:
-            frame.pop('vars', None)
-            frame.pop('pre_context', None)
-            frame.pop('post_context', None)
+        for idx in app_frames[half_max:-half_max]:
+            slimmed.add(idx)
+
+    return slimmed
+
+
+def slim_frame_data(frames, frame_allowance=25):
+    """
+    Removes various excess metadata from middle frames which go beyond
+    ``frame_allowance``.
+
+    Returns ``frames``.
+    """
+    slimmed = _get_slimmed_indexes(
+        [frame.get('in_app') for frame in frames], frame_allowance)
+
+    for idx in slimmed:
+        frame = frames[idx]
+        frame.pop('vars', None)
+        frame.pop('pre_context', None)
+        frame.pop('post_context', None)
 
     return frames
 
@@ -224,22 +403,36 @@ def slim_string(value, length=512):
 
 
 def get_stack_info(frames, transformer=transform, capture_locals=True,
-                   frame_allowance=25):
+                   frame_allowance=25, in_app=None):
     """
     Given a list of frames, returns a list of stack information
     dictionary objects that are JSON-ready.
 
+    Frames may also be given as ``(frame, lineno, repeats)``, as yielded
+    by ``iter_traceback_frames(tb, collapse_recursion=True)``, in which case
+    the collapsed frames are reported in ``frames_omitted``.
+
+    Only frames within ``frame_allowance`` get their locals and surrounding
+    source context collected. ``in_app`` may be a callable taking a module
+    name, in which case application frames are preferred over system
+    frames when choosing them.
+
     We have to be careful here as certain implementations of the
     _Frame class do not contain the necessary data to lookup all
     of the information we want.
     """
     __traceback_hide__ = True  # NOQA
 
-    result = []
+    visible = []
+    block = None
     for frame_info in frames:
+        repeats = 1
         # Old, terrible API
         if isinstance(frame_info, (list, tuple)):
-            frame, lineno = frame_info
+            if len(frame_info) == 3:
+                frame, lineno, repeats = frame_info
+            else:
+                frame, lineno = frame_info
 
         else:
             frame = frame_info
@@ -250,7 +443,34 @@ def get_stack_info(frames, transformer=transform, capture_locals=True,
         if _getitem_from_frame(f_locals, '__traceback_hide__'):
             continue
 
+        # a block of frames collapsed by iter_traceback_frames()
+        if repeats > 1:
+            if block is None:
+                block = [len(visible), len(visible), repeats]
+            block[1] = len(visible) + 1
+
         f_globals = getattr(frame, 'f_globals', {})
+        module_name = _getitem_from_frame(f_globals, '__name__')
+        visible.append((frame, lineno, f_globals, module_name))
+
+    frames_omitted = None
+    if block is not None:
+        # the first copy of the block is kept, the others were dropped
+        block_start, block_end, repeats = block
+        omitted = (block_end - block_start) * (repeats - 1)
+        frames_omitted = [block_end, block_end + omitted]
+
+    # decide which frames are slimmed before doing any of the expensive work
+    if in_app is None:
+        app_flags = [False] * len(visible)
+    else:
+        app_flags = [bool(module_name and in_app(module_name))
+                     for _, _, _, module_name in visible]
+    slimmed = _get_slimmed_indexes(app_flags, frame_allowance)
+
+    result = []
+    for idx, (frame, lineno, f_globals, module_name) in enumerate(visible):
+        is_slimmed = idx in slimmed
 
         f_code = getattr(frame, 'f_code', None)
         if f_code:
@@ -261,14 +481,13 @@ def get_stack_info(frames, transformer=transform, capture_locals=True,
             function = None
 
         loader = _getitem_from_frame(f_globals, '__loader__')
-        module_name = _getitem_from_frame(f_globals, '__name__')
 
         if lineno:
             lineno -= 1
 
         if lineno is not None and abs_path:
-            pre_context, context_line, post_context = \
-                get_lines_from_file(abs_path, lineno, 5, loader, module_name)
+            pre_context, context_line, post_context = get_lines_from_file(
+                abs_path, lineno, 0 if is_slimmed else 5, loader, module_name)
         else:
             pre_context, context_line, post_context = None, None, None
 
@@ -291,21 +510,26 @@ def get_stack_info(frames, transformer=transform, capture_locals=True,
             'function': function or '<unknown>',
             'lineno': lineno + 1,
         }
-        if capture_locals:
+        if capture_locals and not is_slimmed:
             f_vars = get_frame_locals(frame, transformer=transformer)
             if f_vars:
                 frame_result['vars'] = f_vars
 
         if context_line is not None:
-            frame_result.update({
-                'pre_context': pre_context,
-                'context_line': context_line,
-                'post_context': post_context,
-            })
+            if is_slimmed:
+                frame_result['context_line'] = context_line
+            else:
+                frame_result.update({
+                    'pre_context': pre_context,
+                    'context_line': context_line,
+                    'post_context': post_context,
+                })
         result.append(frame_result)
 
     stackinfo = {
-        'frames': slim_frame_data(result, frame_allowance=frame_allowance),
+        'frames': result,
     }
+    if frames_omitted:
+        stackinfo['frames_omitted'] = frames_omitted
 
     return stackinfo
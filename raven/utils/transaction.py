@@ -1,6 +1,6 @@
 from __future__ import absolute_import
 
-from threading import local
+from raven.utils.contextlocal import ContextLocal
 
 
 class TransactionContext(object):
@@ -16,9 +16,21 @@ class TransactionContext(object):
         self.stack.pop(self.context)
 
 
-class TransactionStack(local):
+class TransactionStack(object):
+    """
+    A stack of transaction names, kept separately per thread and per asyncio
+    task or greenlet (see ``ContextLocal``).
+    """
+
     def __init__(self):
-        self.stack = []
+        self._stack = ContextLocal(list)
+
+    @property
+    def stack(self):
+        return self._stack.get()
+
+    def _get_writable_stack(self):
+        return self._stack.get_writable(list)
 
     def __len__(self):
         return len(self.stack)
@@ -30,7 +42,7 @@ class TransactionStack(local):
         return TransactionContext(self, context)
 
     def clear(self):
-        self.stack = []
+        self._stack.set([])
 
     def peek(self):
         try:
@@ -39,13 +51,14 @@ class TransactionStack(local):
             return None
 
     def push(self, context):
-        self.stack.append(context)
+        self._get_writable_stack().append(context)
         return context
 
     def pop(self, context=None):
+        stack = self._get_writable_stack()
         if context is None:
-            return self.stack.pop()
+            return stack.pop()
 
-        while self.stack:
-            if self.stack.pop() is context:
+        while stack:
+            if stack.pop() is context:
                 return context
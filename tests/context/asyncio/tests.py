@@ -0,0 +1,145 @@
+from __future__ import absolute_import
+
+import asyncio
+import gc
+import tracemalloc
+
+from raven.base import Client
+from raven.utils.testutils import TestCase
+
+
+class TempStoreClient(Client):
+    def __init__(self, **kwargs):
+        self.events = []
+        super(TempStoreClient, self).__init__(**kwargs)
+
+    def is_enabled(self):
+        return True
+
+    def send(self, **kwargs):
+        self.events.append(kwargs)
+
+
+class AsyncioContextTest(TestCase):
+    def setUp(self):
+        self.client = TempStoreClient()
+        self.loop = asyncio.new_event_loop()
+        # drop the breadcrumb asyncio logs for the new loop
+        self.client.context.clear()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def run_tasks(self, count, capture=True):
+        client = self.client
+
+        async def handle_request(idx):
+            client.tags_context({'request': idx})
+            client.extra_context({'idx': idx})
+            client.captureBreadcrumb(message='request %d' % idx)
+            with client.transaction('/request/%d' % idx):
+                # let all the other tasks run in between
+                await asyncio.sleep(0)
+                await asyncio.sleep(0)
+                if capture:
+                    client.captureMessage('done %d' % idx)
+            if not capture:
+                return None
+            return (
+                client.context.get(),
+                [c['message'] for c in client.context.breadcrumbs.get_buffer()],
+            )
+
+        async def main():
+            return await asyncio.gather(
+                *[handle_request(idx) for idx in range(count)])
+
+        return self.loop.run_until_complete(main())
+
+    def test_tasks_are_isolated(self):
+        self.client.tags_context({'shared': 'yes'})
+        self.client.captureBreadcrumb(message='startup')
+
+        results = self.run_tasks(1000)
+
+        for idx, (data, crumbs) in enumerate(results):
+            assert data['tags'] == {'shared': 'yes', 'request': idx}
+            assert data['extra'] == {'idx': idx}
+            assert crumbs == ['startup', 'request %d' % idx]
+
+        assert len(self.client.events) == 1000
+        for event in self.client.events:
+            idx = int(event['tags']['request'])
+            assert event['message'] == 'done %d' % idx
+            assert event['transaction'] == '/request/%d' % idx
+
+        # the tasks never touched the context they were spawned from
+        assert self.client.context.get() == {'tags': {'shared': 'yes'}}
+        crumbs = self.client.context.breadcrumbs.get_buffer()
+        assert [c['message'] for c in crumbs] == ['startup']
+        assert len(self.client.transaction) == 0
+
+    def test_reused_task_memory(self):
+        client = self.client
+        results = []
+
+        async def grandchild():
+            client.tags_context({'gc': 1})
+
+        async def child(released):
+            await released.wait()
+            # the parent task is gone, its memory is free to be reused by
+            # the grandchild
+            await self.loop.create_task(grandchild())
+            results.append(client.context.get()['tags'])
+
+        async def parent(released):
+            client.tags_context({'p': 1})
+            return self.loop.create_task(child(released))
+
+        async def main():
+            for _ in range(20):
+                released = asyncio.Event()
+                parent_task = self.loop.create_task(parent(released))
+                child_task = await parent_task
+                del parent_task
+                gc.collect()
+                released.set()
+                await child_task
+
+        self.loop.run_until_complete(main())
+        assert results == [{'p': 1}] * 20
+
+    def test_reads_do_not_copy_state(self):
+        client = self.client
+        parent = client.context.breadcrumbs
+
+        async def task():
+            assert client.context.breadcrumbs is parent
+            assert not client.context.exceptions_to_skip
+            client.context.skip_exception('key')
+            assert client.context.breadcrumbs is not parent
+            return client.context.exceptions_to_skip
+
+        assert self.loop.run_until_complete(task()) == set(['key'])
+        assert not client.context.exceptions_to_skip
+
+    def test_memory_per_task(self):
+        # fill the shared breadcrumb buffer, which every task copies
+        for idx in range(100):
+            self.client.captureBreadcrumb(message='startup %d' % idx)
+        self.run_tasks(10, capture=False)
+
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            self.run_tasks(1000, capture=False)
+            gc.collect()
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        # all tasks are alive at the same time, each with its own copy of
+        # the context; none of it outlives the tasks
+        assert (peak - before) / 1000 < 8 * 1024
+        assert (current - before) / 1000 < 256
@@ -38,6 +38,34 @@ class ContextTest(TestCase):
             }
         }
 
+    def test_deferred(self):
+        calls = []
+
+        def provider():
+            calls.append(1)
+            return {'url': 'http://example.com'}
+
+        context = Context()
+        context.merge({'request': provider, 'tags': {'foo': 'bar'}})
+        assert calls == []
+        assert context.get()['request'] is provider
+
+        expected = {
+            'request': {'url': 'http://example.com'},
+            'tags': {'foo': 'bar'},
+        }
+        assert context.resolve() == expected
+        assert context.resolve() == expected
+        assert calls == [1]
+
+    def test_deferred_failure(self):
+        def provider():
+            raise ValueError('broken')
+
+        context = Context()
+        context.merge({'request': provider, 'user': {'id': 1}})
+        assert context.resolve() == {'user': {'id': 1}}
+
     def test_thread_binding(self):
         client = Client()
         called = []
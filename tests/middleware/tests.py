@@ -174,3 +174,27 @@ class MiddlewareTestCase(TestCase):
         list(response)  # exhaust iterator
         response.close()
         self.assertTrue(iterable.closed, True)
+
+    def test_http_context_is_lazy(self):
+        calls = []
+
+        class TestSentry(Sentry):
+            def get_http_context(self, environ):
+                calls.append(environ)
+                return Sentry.get_http_context(self, environ)
+
+        iterable = SimpleIteratable()
+        app = ExampleApp(iterable)
+        middleware = TestSentry(app, client=self.client)
+
+        response = middleware(self.request.environ, lambda *args: None)
+        assert calls == []
+
+        self.client.captureMessage('hello')
+        assert len(calls) == 1
+        event = self.client.events.pop(0)
+        assert event['request']['url'] == 'http://localhost/an-error'
+
+        list(response)
+        response.close()
+        assert len(calls) == 1
@@ -1,11 +1,14 @@
 # -*- coding: utf-8 -*-
 
+import copy
+
 from mock import Mock
 
 import raven
 from raven.utils.testutils import TestCase
 from raven.processors import SanitizeKeysProcessor, \
-    SanitizePasswordsProcessor, RemovePostDataProcessor, RemoveStackLocalsProcessor
+    SanitizePasswordsProcessor, RemovePostDataProcessor, \
+    RemoveStackLocalsProcessor, Processor, ProcessorPipeline, KeyMatcher
 
 
 VARS = {
@@ -401,3 +404,92 @@ class RemoveStackLocalsProcessorTest(TestCase):
         for value in result['exception']['values']:
             for frame in value['stacktrace']['frames']:
                 self.assertFalse('vars' in frame)
+
+
+class KeyMatcherTest(TestCase):
+    def test_matches(self):
+        matcher = KeyMatcher(['password', 'pass', 'api_key', 'a.b'])
+        assert matcher.matches('PASSWORD')
+        assert matcher.matches('my_api_key')
+        assert matcher.matches(b'passwd')
+        assert matcher.matches('x_a.b')
+        assert not matcher.matches('a_b')
+        assert not matcher.matches('username')
+        assert not matcher.matches(42)
+        assert not matcher.matches(['unhashable'])
+
+    def test_no_keys(self):
+        matcher = KeyMatcher([])
+        assert not matcher.matches('password')
+
+    def test_cache_is_bounded(self):
+        matcher = KeyMatcher(['password'])
+        matcher.max_cache_size = 10
+        for i in range(25):
+            assert matcher.matches('password%d' % i)
+        assert len(matcher._cache) <= 10
+
+    def test_processor_follows_configured_keys(self):
+        client = Mock(sanitize_keys=['foo'])
+        proc = SanitizeKeysProcessor(client)
+        assert proc.sanitize('foo', 'value') == proc.MASK
+        client.sanitize_keys = ['bar']
+        assert proc.sanitize('foo', 'value') == 'value'
+        assert proc.sanitize('bar', 'value') == proc.MASK
+
+
+class TagProcessor(Processor):
+    def process(self, data, **kwargs):
+        return {'tags': {'processed': 'yes'}}
+
+
+class ProcessorPipelineTest(TestCase):
+    def get_processors(self):
+        client = Mock(sanitize_keys=['custom_key1', 'custom_key2'])
+        return [
+            SanitizePasswordsProcessor(client),
+            SanitizeKeysProcessor(client),
+            TagProcessor(client),
+            SanitizeKeysProcessor(Mock(sanitize_keys=['custom_key3'])),
+            RemovePostDataProcessor(client),
+        ]
+
+    def test_matches_sequential_processing(self):
+        data = get_http_data()
+        data['extra'] = VARS
+        data['request']['query_string'] = 'foo=bar&password=hello'
+        expected = copy.deepcopy(data)
+        for processor in self.get_processors():
+            expected.update(processor.process(expected))
+
+        pipeline = ProcessorPipeline(self.get_processors())
+        assert pipeline.process(data) == expected
+        assert data['tags'] == {'processed': 'yes'}
+        assert 'data' not in data['request']
+
+    def test_stages(self):
+        pipeline = ProcessorPipeline(self.get_processors(), names=[
+            'passwords', 'keys', 'tags', 'more_keys', 'post_data'])
+        assert [name for name, _ in pipeline.stages] == [
+            'passwords, keys', 'tags', 'more_keys, post_data']
+
+        pipeline.process(get_extra_data())
+        pipeline.process(get_extra_data())
+        timings = pipeline.get_timings()
+        # the fused sanitizers are timed together
+        assert sorted(timings) == sorted(
+            ['passwords, keys', 'tags', 'more_keys', 'post_data'])
+        for timing in timings.values():
+            assert timing['calls'] == 2
+            assert timing['time'] >= 0
+
+    def test_client_instantiates_processors_once(self):
+        client = raven.Client(processors=[
+            'raven.processors.SanitizePasswordsProcessor'])
+        processors = client.get_processors()
+        assert client.get_processors() is processors
+        assert isinstance(processors[0], SanitizePasswordsProcessor)
+
+        client.processors = ['raven.processors.RemovePostDataProcessor']
+        assert isinstance(client.get_processors()[0],
+                          RemovePostDataProcessor)
@@ -0,0 +1,99 @@
+from __future__ import absolute_import
+
+from raven.base import Client
+from raven.sampling import AdaptiveSampler
+from raven.utils.testutils import TestCase
+
+
+class TempStoreClient(Client):
+    def __init__(self, **kwargs):
+        self.events = []
+        super(TempStoreClient, self).__init__(**kwargs)
+
+    def is_enabled(self):
+        return True
+
+    def send(self, **kwargs):
+        self.events.append(kwargs)
+
+
+class AdaptiveSamplerTest(TestCase):
+    def test_below_budget(self):
+        sampler = AdaptiveSampler(10, window=10)
+        rates = [sampler.get_rate(now=100 + i) for i in range(100)]
+        assert rates == [1.0] * 100
+
+    def test_converges_to_budget(self):
+        sampler = AdaptiveSampler(10, window=10)
+        # 1000 events per second for a minute
+        for i in range(60000):
+            rate = sampler.get_rate(now=100 + i / 1000.0)
+        assert abs(rate - 0.01) < 0.0005
+
+    def test_recovers_after_burst(self):
+        sampler = AdaptiveSampler(10, window=10)
+        for i in range(10000):
+            sampler.get_rate(now=100)
+        assert sampler.get_rate(now=101) < 0.02
+        assert sampler.get_rate(now=160) == 1.0
+
+    def test_bucket_budget(self):
+        sampler = AdaptiveSampler(100, bucket_rate=1, window=10)
+        for i in range(1000):
+            sampler.get_rate('storm', now=100 + i / 100.0)
+        assert sampler.get_rate('storm', now=110) < 0.2
+        assert sampler.get_rate('other', now=110) == 1.0
+        assert sampler.get_rate(now=110) == 1.0
+
+    def test_buckets_are_bounded(self):
+        sampler = AdaptiveSampler(100, bucket_rate=1, max_buckets=10)
+        for i in range(25):
+            sampler.get_rate('bucket %d' % i, now=100 + i)
+        assert len(sampler) <= 10
+
+    def test_budget_must_be_positive(self):
+        self.assertRaises(ValueError, AdaptiveSampler, 0)
+        self.assertRaises(ValueError, AdaptiveSampler, 1, bucket_rate=0)
+
+
+class ClientSamplingTest(TestCase):
+    def test_disabled_by_default(self):
+        client = TempStoreClient()
+        assert client.adaptive_sampler is None
+        client.captureMessage('test')
+        assert 'sample_rate' not in client.events[0]['extra']
+
+    def test_records_applied_rate(self):
+        client = TempStoreClient(sample_budget=1, sample_budget_window=1,
+                                 _random_seed=0)
+        for _ in range(200):
+            client.captureMessage('test')
+        assert 0 < len(client.events) < 200
+
+        rates = [e['extra'].get('sample_rate') for e in client.events]
+        assert 'sample_rate' not in client.events[0]['extra']
+        assert all(r is not None for r in rates[1:])
+
+        # the number of captured events can be estimated from the rates
+        estimate = sum(1 / float(r) if r is not None else 1 for r in rates)
+        assert 100 < estimate < 400
+
+    def test_combines_with_sample_rate(self):
+        client = TempStoreClient(sample_rate=0.5, sample_budget=1000,
+                                 _random_seed=0)
+        for _ in range(50):
+            client.captureMessage('test')
+        assert client.events
+        assert all(e['extra']['sample_rate'] == client.transform(0.5)
+                   for e in client.events)
+
+    def test_budget_per_fingerprint(self):
+        client = TempStoreClient(sample_budget=1000,
+                                 sample_budget_per_fingerprint=0.1,
+                                 _random_seed=0)
+        for _ in range(100):
+            client.captureMessage('storm')
+        client.captureMessage('other')
+        assert len(client.events) < 20
+        assert client.events[-1]['message'] == 'other'
+        assert 'sample_rate' not in client.events[-1]['extra']
@@ -0,0 +1,174 @@
+from __future__ import absolute_import
+
+import os
+import shutil
+import tempfile
+import threading
+
+import pytest
+
+from raven.base import Client, ClientState
+from raven.utils.testutils import TestCase
+
+import raven.shared
+from raven.shared import (
+    SharedClientState, SharedEventAggregator, SharedState)
+
+pytestmark = pytest.mark.skipif(
+    raven.shared.fcntl is None, reason='requires fcntl')
+
+
+class TempStoreClient(Client):
+    def __init__(self, **kwargs):
+        self.events = []
+        super(TempStoreClient, self).__init__(**kwargs)
+
+    def is_enabled(self):
+        return True
+
+    def send(self, **kwargs):
+        self.events.append(kwargs)
+
+
+class SharedTestCase(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'raven.state')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+
+class SharedStateTest(SharedTestCase):
+    def test_adopts_existing_table(self):
+        SharedState(self.path, slots=16).close()
+        shared = SharedState(self.path, slots=64)
+        assert shared.slots == 16
+
+    def test_replaces_invalid_file(self):
+        with open(self.path, 'wb') as fp:
+            fp.write(b'junk')
+        with open(self.path, 'rb') as old:
+            shared = SharedState(self.path, slots=16)
+            # processes which mapped the old file keep their view of it
+            assert old.read() == b'junk'
+        assert shared.slots == 16
+        assert shared.get_backoff()[0] == ClientState.ONLINE
+        assert os.listdir(self.tmpdir) == ['raven.state']
+
+    def hold_lock(self, shared, func):
+        done = threading.Event()
+
+        def run():
+            func()
+            done.set()
+
+        with shared.lock():
+            thread = threading.Thread(target=run)
+            thread.start()
+            assert not done.wait(0.1)
+        thread.join()
+        assert done.is_set()
+
+    def test_tables_of_one_process_exclude_each_other(self):
+        first = SharedState(self.path)
+        second = SharedState(self.path)
+
+        def lock_second():
+            with second.lock():
+                pass
+
+        self.hold_lock(first, lock_second)
+        # closing a table would release the record lock of the other
+        self.hold_lock(first, second.close)
+
+    def test_backoff_is_shared(self):
+        first = SharedClientState(SharedState(self.path))
+        second = SharedClientState(SharedState(self.path))
+        assert second.should_try()
+
+        first.set_fail(retry_after=60)
+        assert second.did_fail()
+        assert not second.should_try()
+        assert second.retry_after == 60
+
+        second.set_success()
+        assert first.should_try()
+        assert not first.did_fail()
+
+    def test_backoff_is_shared_with_forked_processes(self):
+        state = SharedClientState(SharedState(self.path))
+        pid = os.fork()
+        if not pid:
+            try:
+                state.set_fail(retry_after=30)
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        assert not state.should_try()
+
+
+class SharedEventAggregatorTest(SharedTestCase):
+    def test_duplicates_are_counted_across_processes(self):
+        first = SharedEventAggregator(SharedState(self.path), window=60,
+                                      limit=2)
+        second = SharedEventAggregator(SharedState(self.path), window=60,
+                                       limit=2)
+        assert first.record('a', now=100) == (True, [])
+        assert second.record('a', now=101) == (True, [])
+        assert not second.record('a', now=102)[0]
+        assert not first.record('a', now=103)[0]
+        assert second.record('b', now=104)[0]
+
+        send, summaries = first.record('a', now=160)
+        assert send
+        assert [(s.fingerprint, s.count, s.start) for s in summaries] == [
+            ('a', 2, 100)]
+        # the window is summarized only once
+        assert second.flush(now=170) == []
+        assert len(first) == 0
+
+    def test_table_is_bounded(self):
+        aggregator = SharedEventAggregator(SharedState(self.path, slots=4),
+                                           window=60, limit=1)
+        aggregator.record('storm', now=100)
+        aggregator.record('storm', now=100)
+        summaries = []
+        for i in range(20):
+            summaries.extend(aggregator.record('fp %d' % i, now=101)[1])
+        assert len(aggregator) == 4
+        assert aggregator.evicted == 17
+        assert [(s.fingerprint, s.count) for s in summaries] == [
+            ('storm', 1)]
+
+
+class ClientSharedStateTest(SharedTestCase):
+    def raise_error(self, client):
+        client.context.clear()
+        try:
+            int('not a number')
+        except ValueError:
+            return client.captureException()
+
+    def test_storms_are_suppressed_across_clients(self):
+        clients = [
+            TempStoreClient(shared_state=self.path, aggregate_window=60,
+                            aggregate_limit=3)
+            for _ in range(2)
+        ]
+        assert isinstance(clients[0].state, SharedClientState)
+        assert isinstance(clients[0].aggregator, SharedEventAggregator)
+        for _ in range(5):
+            for client in clients:
+                self.raise_error(client)
+        assert sum(len(client.events) for client in clients) == 3
+
+        clients[1].flush_aggregates()
+        summary = clients[1].events[-1]
+        assert summary['message'].startswith('Suppressed 7 duplicate events')
+
+    def test_rate_limit_silences_all_clients(self):
+        first = TempStoreClient(shared_state=self.path)
+        second = TempStoreClient(shared_state=self.path)
+        first.state.set_fail(retry_after=60)
+        assert not second.state.should_try()
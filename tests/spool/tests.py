@@ -0,0 +1,135 @@
+from __future__ import absolute_import
+
+import os
+import shutil
+import tempfile
+import time
+
+from raven.spool import EventSpool
+from raven.utils.testutils import TestCase
+
+
+class EventSpoolTest(TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def replay(self, spool, accept=None):
+        sent = []
+
+        def send(payload):
+            if accept is not None and len(sent) >= accept:
+                return False
+            sent.append(payload)
+            return True
+
+        spool.replay(send)
+        return sent
+
+    def test_replay_in_order(self):
+        spool = EventSpool(self.path)
+        for i in range(5):
+            spool.append(('event %d' % i).encode('utf-8'))
+
+        assert spool.has_pending()
+        assert self.replay(spool) == [
+            ('event %d' % i).encode('utf-8') for i in range(5)]
+        assert not spool.has_pending()
+        assert os.listdir(self.path) == []
+
+    def test_replay_stops_and_respools(self):
+        spool = EventSpool(self.path)
+        for i in range(5):
+            spool.append(('event %d' % i).encode('utf-8'))
+
+        assert self.replay(spool, accept=2) == [b'event 0', b'event 1']
+        assert self.replay(spool) == [b'event 2', b'event 3', b'event 4']
+
+    def test_replay_stops_and_keeps_order(self):
+        spool = EventSpool(self.path, segment_size=30)
+        for i in range(5):
+            spool.append(('event %d' % i).encode('utf-8'))
+
+        assert self.replay(spool, accept=1) == [b'event 0']
+        spool.append(b'event 5')
+        assert self.replay(spool) == [
+            ('event %d' % i).encode('utf-8') for i in range(1, 6)]
+
+    def test_crash_while_replaying_keeps_segment(self):
+        spool = EventSpool(self.path)
+        for i in range(3):
+            spool.append(('event %d' % i).encode('utf-8'))
+
+        sent = []
+
+        def send(payload):
+            if sent:
+                raise KeyboardInterrupt()
+            sent.append(payload)
+            return True
+
+        with self.assertRaises(KeyboardInterrupt):
+            spool.replay(send)
+        assert sent == [b'event 0']
+
+        # the records are replayed again once the process restarts
+        assert self.replay(EventSpool(self.path)) == [
+            b'event 0', b'event 1', b'event 2']
+
+    def test_rotates_segments(self):
+        spool = EventSpool(self.path, segment_size=100)
+        for i in range(10):
+            spool.append(b'x' * 40)
+
+        segments = [n for n in os.listdir(self.path) if n.endswith('.spool')]
+        assert len(segments) == 5
+        assert len(self.replay(spool)) == 10
+
+    def test_evicts_oldest_segments(self):
+        spool = EventSpool(self.path, segment_size=100, max_bytes=300)
+        for i in range(20):
+            spool.append(('%02d' % i).encode('utf-8') * 20)
+
+        sent = self.replay(spool)
+        assert len(sent) < 20
+        assert sent[-1] == b'19' * 20
+        assert sent == sorted(sent)
+
+    def test_skips_expired_records(self):
+        spool = EventSpool(self.path, max_age=60)
+        spool.append(b'old', timestamp=time.time() - 120)
+        spool.append(b'new')
+
+        assert self.replay(spool) == [b'new']
+
+    def test_survives_restart(self):
+        spool = EventSpool(self.path, fsync='always')
+        spool.append(b'foo')
+        spool.append(b'bar')
+        spool.close()
+
+        assert self.replay(EventSpool(self.path)) == [b'foo', b'bar']
+
+    def test_recovers_active_segment_of_dead_process(self):
+        spool = EventSpool(self.path, fsync='always')
+        spool.append(b'foo')
+        # simulate a crash of the current process by not closing the spool
+        # and reopening it under the same pid
+        assert self.replay(EventSpool(self.path)) == [b'foo']
+
+    def test_ignores_truncated_record(self):
+        spool = EventSpool(self.path)
+        spool.append(b'foo')
+        spool.append(b'bar')
+        spool.close()
+        segment = os.path.join(self.path, os.listdir(self.path)[0])
+        with open(segment, 'rb+') as fp:
+            fp.truncate(os.path.getsize(segment) - 1)
+
+        assert self.replay(EventSpool(self.path)) == [b'foo']
+
+    def test_unknown_fsync_policy(self):
+        with self.assertRaises(ValueError):
+            EventSpool(self.path, fsync='sometimes')
@@ -5,8 +5,10 @@ from raven.utils.testutils import TestCase
 from raven.base import Client
 
 # Some internal stuff to extend the transport layer
+from raven.exceptions import RateLimited
 from raven.transport import Transport
 from raven.transport.exceptions import DuplicateScheme
+from raven.transport.http import HTTPTransport
 
 # Simplify comparing dicts with primitive values:
 from raven.utils import json
@@ -14,8 +16,18 @@ from raven.utils import json
 import datetime
 import calendar
 import pytz
+import socket
+import threading
+import time
 import zlib
 
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
 
 class DummyScheme(Transport):
 
@@ -95,3 +107,83 @@ class TransportTest(TestCase):
         del msg['event_id']
 
         self.assertDictContainsSubset(expected, msg)
+
+
+class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class KeepAliveStoreHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        self.server.peers.append(self.client_address)
+        status = self.server.status
+        self.send_response(status)
+        if status == 429:
+            self.send_header('Retry-After', '30')
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    def log_message(self, *args):
+        pass
+
+
+class KeepAliveHTTPTransportTest(TestCase):
+    def setUp(self):
+        self.server = ThreadedHTTPServer(('127.0.0.1', 0), KeepAliveStoreHandler)
+        self.server.peers = []
+        self.server.status = 200
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, kwargs={'poll_interval': 0.05})
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = 'http://127.0.0.1:%d/api/1/store/' % self.server.server_port
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_reuses_connection(self):
+        transport = HTTPTransport(keepalive='1')
+        for _ in range(3):
+            transport.send(self.url, b'foo', {})
+
+        assert len(self.server.peers) == 3
+        assert len(set(self.server.peers)) == 1
+
+    def test_without_keepalive_opens_new_connections(self):
+        transport = HTTPTransport()
+        for _ in range(3):
+            transport.send(self.url, b'foo', {})
+
+        assert len(set(self.server.peers)) == 3
+
+    def test_reconnects_after_idle_timeout(self):
+        transport = HTTPTransport(keepalive=True, pool_idle_timeout='0')
+        transport.send(self.url, b'foo', {})
+        time.sleep(0.01)
+        transport.send(self.url, b'foo', {})
+
+        assert len(set(self.server.peers)) == 2
+
+    def test_reconnects_when_server_closes_connection(self):
+        transport = HTTPTransport(keepalive=True)
+        transport.send(self.url, b'foo', {})
+        pool = transport.get_pool(self.url)
+        conn, _ = pool._pool[0]
+        conn.sock.shutdown(socket.SHUT_RDWR)
+
+        transport.send(self.url, b'foo', {})
+
+        assert len(set(self.server.peers)) == 2
+
+    def test_rate_limited(self):
+        self.server.status = 429
+        transport = HTTPTransport(keepalive=True)
+        with self.assertRaises(RateLimited) as cm:
+            transport.send(self.url, b'foo', {})
+        assert cm.exception.retry_after == 30
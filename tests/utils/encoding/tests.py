@@ -5,7 +5,9 @@ import uuid
 from raven.utils import compat
 from raven.utils import json
 from raven.utils.testutils import TestCase
-from raven.utils.serializer import transform
+from raven.utils.serializer import Serializer, transform
+from raven.utils.serializer.manager import (
+    SerializationManager, _get_serializer, manager as serialization_manager)
 
 
 class TransformTest(TestCase):
@@ -194,3 +196,97 @@ class TransformTest(TestCase):
             assert result == "b'\\xd7'"
         else:
             assert result == "'\\xd7'"
+
+
+class DispatchTest(TestCase):
+    def setUp(self):
+        self.manager = SerializationManager()
+        for serializer in serialization_manager.serializers:
+            self.manager.register(serializer)
+
+    def test_caches_candidates_per_type(self):
+        assert transform(42, manager=self.manager) == '42'
+        candidates = self.manager.dispatch[int]
+        assert len(candidates) == 1
+        assert candidates[0][1] is False
+
+    def test_value_dependent_serializers_are_still_asked(self):
+        class Foo(object):
+            pass
+
+        foo = Foo()
+        assert transform(foo, manager=self.manager) == repr(foo)
+        foo.__sentry__ = lambda: 'sentry'
+        assert transform(foo, manager=self.manager) == "'sentry'"
+
+    def test_register_invalidates(self):
+        class Foo(object):
+            pass
+
+        assert transform(Foo(), manager=self.manager).startswith('<')
+        assert Foo in self.manager.dispatch
+
+        class FooSerializer(Serializer):
+            types = (Foo,)
+
+            def serialize(self, value, **kwargs):
+                return 'foo'
+
+        self.manager.register(FooSerializer)
+        assert self.manager.dispatch == {}
+        assert transform(Foo(), manager=self.manager) == 'foo'
+
+    def test_object_with_fake_class(self):
+        class Proxy(object):
+            __class__ = property(lambda self: dict)
+
+            def items(self):
+                return [('foo', 'bar')]
+
+            # what DictSerializer uses on Python 2
+            iteritems = items
+
+        expected = transform({'foo': 'bar'}, manager=self.manager)
+        assert transform(Proxy(), manager=self.manager) == expected
+        assert Proxy not in self.manager.dispatch
+
+
+class SerializerPoolTest(TestCase):
+    def setUp(self):
+        self.manager = SerializationManager()
+        for serializer in serialization_manager.serializers:
+            self.manager.register(serializer)
+
+    def test_reuses_serializer(self):
+        transform([1, 2], manager=self.manager)
+        serializer = _get_serializer(self.manager)
+        transform({'a': 1}, manager=self.manager)
+        assert _get_serializer(self.manager) is serializer
+        assert not serializer.context
+
+    def test_rebuilt_after_register(self):
+        serializer = _get_serializer(self.manager)
+
+        class FooSerializer(Serializer):
+            types = (uuid.UUID,)
+
+        self.manager.register(FooSerializer)
+        assert _get_serializer(self.manager) is not serializer
+
+    def test_nested_transform(self):
+        manager = self.manager
+        outer = [uuid.uuid4()]
+        calls = []
+
+        class NestedSerializer(Serializer):
+            types = (uuid.UUID,)
+
+            def serialize(self, val, **kwargs):
+                if calls:
+                    return 'inner'
+                calls.append(val)
+                # must not be mistaken for a cycle of the outer call
+                return transform(outer, manager=manager)
+
+        manager.register(NestedSerializer)
+        assert transform(outer, manager=manager) == (('inner',),)
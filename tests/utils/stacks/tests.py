@@ -2,11 +2,17 @@
 from __future__ import unicode_literals
 
 import os.path
+import shutil
+import sys
+import tempfile
 
 from mock import Mock
 from raven.utils.compat import iterkeys, PY3
 from raven.utils.testutils import TestCase
-from raven.utils.stacks import get_stack_info, get_lines_from_file
+from raven.utils.stacks import (
+    get_stack_info, get_lines_from_file, iter_stack_frames,
+    iter_traceback_frames, source_cache, SourceCache
+)
 
 
 class Context(object):
@@ -68,6 +74,109 @@ class GetStackInfoTest(TestCase):
         assert results['frames'][8]['filename'] == '8'
         assert results['frames'][9]['filename'] == '9'
 
+    def test_frame_allowance_skips_extraction(self):
+        frames = []
+        for x in range(10):
+            frame = Mock()
+            frame.f_locals = {'k': 'v'}
+            frame.f_globals = {'__name__': 'app' if x in (4, 5) else 'lib'}
+            frame.f_code.co_filename = __file__
+            frame.f_code.co_name = __name__
+            frames.append((frame, 1))
+
+        transformer = Mock(side_effect=repr)
+        results = get_stack_info(frames, transformer=transformer,
+                                 frame_allowance=4,
+                                 in_app=lambda m: m == 'app')
+        with_vars = [idx for idx, frame in enumerate(results['frames'])
+                     if 'vars' in frame]
+        assert with_vars == [0, 4, 5, 9]
+        assert transformer.call_count == 4
+        for frame in results['frames']:
+            assert 'context_line' in frame
+            assert ('pre_context' in frame) == ('vars' in frame)
+
+
+class IterStackFramesTest(TestCase):
+    def test_current_stack(self):
+        def outer():
+            return inner()
+
+        def inner():
+            return list(iter_stack_frames())
+
+        frames = outer()
+        assert frames[-1][0].f_code.co_name == 'inner'
+        assert frames[-2][0].f_code.co_name == 'outer'
+        assert frames[-3][0].f_code.co_name == 'test_current_stack'
+        assert frames[-1][1] == frames[-1][0].f_lineno
+
+    def test_hidden_frames(self):
+        def hidden():
+            __traceback_hide__ = True  # NOQA
+            return list(iter_stack_frames())
+
+        frames = hidden()
+        assert frames[-1][0].f_code.co_name == 'test_hidden_frames'
+
+
+def recurse(depth):
+    if depth:
+        return recurse(depth - 1)
+    raise ValueError(depth)
+
+
+def mutual_a(depth):
+    if depth:
+        return mutual_b(depth)
+    raise ValueError(depth)
+
+
+def mutual_b(depth):
+    return mutual_a(depth - 1)
+
+
+class IterTracebackFramesTest(TestCase):
+    def get_traceback(self, func, depth):
+        try:
+            func(depth)
+        except ValueError:
+            return sys.exc_info()[2]
+
+    def test_no_collapse_by_default(self):
+        tb = self.get_traceback(recurse, 50)
+        frames = list(iter_traceback_frames(tb))
+        assert len(frames) == 52
+        assert all(len(f) == 2 for f in frames)
+
+    def test_collapse_recursion(self):
+        tb = self.get_traceback(recurse, 50)
+        frames = list(iter_traceback_frames(tb, collapse_recursion=True))
+        # the test method, one copy of the recursive frame and the
+        # innermost call that raised
+        assert [f[2] for f in frames] == [1, 50, 1]
+        assert frames[0][0].f_code.co_name == 'get_traceback'
+        assert frames[1][0].f_code.co_name == 'recurse'
+        assert frames[2][1] != frames[1][1]
+
+    def test_collapse_mutual_recursion(self):
+        tb = self.get_traceback(mutual_a, 20)
+        frames = list(iter_traceback_frames(tb, collapse_recursion=True))
+        assert [f[2] for f in frames] == [1, 20, 20, 1]
+
+    def test_shallow_recursion_is_kept(self):
+        tb = self.get_traceback(recurse, 5)
+        frames = list(iter_traceback_frames(tb, collapse_recursion=True))
+        assert len(frames) == 7
+        assert all(f[2] == 1 for f in frames)
+
+    def test_frames_omitted(self):
+        tb = self.get_traceback(recurse, 50)
+        result = get_stack_info(
+            iter_traceback_frames(tb, collapse_recursion=True))
+        assert len(result['frames']) == 3
+        assert result['frames_omitted'] == [2, 51]
+
 
 class FailLoader():
     '''
@@ -107,3 +216,61 @@ class GetLineFromFileTest(TestCase):
         self.assertEqual(
             get_lines_from_file(filename, 3, 1, self.loader, module),
             (None, None, None))
+
+
+class CountingLoader(object):
+    def __init__(self, source):
+        self.source = source
+        self.calls = 0
+
+    def get_source(self, module_name):
+        self.calls += 1
+        return self.source
+
+
+class SourceCacheTest(TestCase):
+    def setUp(self):
+        source_cache.clear()
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_loader_source_is_cached(self):
+        loader = CountingLoader('a\nb\nc\nd\n')
+        filename = os.path.join(self.tmpdir, 'module.py')
+        hits = source_cache.hits
+        for _ in range(3):
+            self.assertEqual(
+                get_lines_from_file(filename, 1, 1, loader, 'module'),
+                (['a'], 'b', ['c']))
+        assert loader.calls == 1
+        assert source_cache.hits == hits + 2
+
+    def test_changed_file_is_read_again(self):
+        filename = os.path.join(self.tmpdir, 'changed.py')
+        with open(filename, 'w') as fp:
+            fp.write('one\ntwo\n')
+        assert get_lines_from_file(filename, 0, 1) == ([], 'one', ['two'])
+
+        with open(filename, 'w') as fp:
+            fp.write('three\nfour\nfive\n')
+        import linecache
+        linecache.checkcache(filename)
+        assert get_lines_from_file(filename, 0, 1) == ([], 'three', ['four'])
+
+    def test_evicts_least_recently_used(self):
+        cache = SourceCache(max_bytes=250)
+        cache.set('a', ['x' * 50])
+        cache.set('b', ['x' * 50])
+        assert cache.get('a') is not None
+        cache.set('c', ['x' * 50])
+        assert cache.get('b') is None
+        assert cache.get('a') is not None
+        assert cache.get('c') is not None
+        assert cache.get_stats()['bytes'] <= 250
+
+    def test_oversized_file_is_not_cached(self):
+        cache = SourceCache(max_bytes=10)
+        cache.set('a', ['x' * 50])
+        assert len(cache) == 0
@@ -1,9 +1,17 @@
 # -*- coding: utf-8 -*-
 
+import mock
+import pytest
+
 from raven.utils.testutils import TestCase
 
 import raven
-from raven.utils import get_versions
+from raven.utils import get_distribution_index, get_versions, varmap
+
+try:
+    from importlib import metadata
+except ImportError:
+    metadata = None
 
 
 class GetVersionsTest(TestCase):
@@ -14,3 +22,70 @@ class GetVersionsTest(TestCase):
     def test_parent_match(self):
         versions = get_versions(['raven.contrib.django'])
         self.assertEquals(versions.get('raven'), raven.VERSION)
+
+    def test_non_blocking_skips_unknown(self):
+        with mock.patch.dict('raven.utils._VERSION_CACHE', clear=True):
+            with mock.patch('raven.utils.get_version_from_app') as lookup:
+                assert get_versions(['raven'], block=False) == {}
+                assert not lookup.called
+
+    def test_without_imports(self):
+        with mock.patch.dict('raven.utils._VERSION_CACHE', clear=True):
+            with mock.patch('raven.utils.get_version_from_app') as lookup:
+                assert get_versions(['tests.utils'],
+                                    import_modules=False) == {}
+                assert not lookup.called
+            # modules without metadata are looked up again when they may be
+            # imported
+            assert 'tests' not in raven.utils._VERSION_CACHE
+
+    @pytest.mark.skipif(metadata is None,
+                        reason='requires importlib.metadata')
+    def test_distribution_metadata(self):
+        distributions, packages = get_distribution_index()
+        assert 'pytest' in distributions
+        with mock.patch.dict('raven.utils._VERSION_CACHE', clear=True):
+            versions = get_versions(['pytest'])
+        self.assertEquals(versions.get('pytest'), metadata.version('pytest'))
+
+
+class VarmapTest(TestCase):
+    def mask(self, key, value):
+        if key == 'password':
+            return '***'
+        return value
+
+    def test_maps_nested_values(self):
+        var = {'a': [1, {'password': 'x'}], 'b': ({'password': 'y'},)}
+        assert varmap(self.mask, var) == {
+            'a': [1, {'password': '***'}],
+            'b': [{'password': '***'}],
+        }
+        assert var['a'][1]['password'] == 'x'
+
+    def test_unchanged_containers_are_kept(self):
+        unchanged = {'b': [1, 2], 'c': {'d': 'e'}}
+        var = {'a': unchanged, 'password': 'x'}
+        result = varmap(self.mask, var)
+        assert result is not var
+        assert result['a'] is unchanged
+        assert varmap(self.mask, unchanged) is unchanged
+
+    def test_tuples_become_lists(self):
+        assert varmap(self.mask, (1, 2)) == [1, 2]
+        assert varmap(self.mask, {'a': ('b',)}) == {'a': ['b']}
+
+    def test_recursion(self):
+        var = {'a': 'b'}
+        var['self'] = var
+        assert varmap(self.mask, var) == {'a': 'b', 'self': '<...>'}
+
+    def test_deep_nesting(self):
+        var = leaf = {}
+        for _ in range(5000):
+            var = {'password': 'x', 'child': var}
+        result = varmap(self.mask, var)
+        for _ in range(5000):
+            assert result['password'] == '***'
+            result = result['child']
+        assert result is leaf